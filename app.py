@@ -2,22 +2,47 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from backtest import run_backtest, default_config, run_backtest_baseline
+from data_layer import SharedDataLayer
+from profiling import Profile
+from universes import list_universes
+from backtest import run_backtest, default_config, run_backtest_baseline, load_market_data, build_events, config_key, DATA_KEYS, EVENT_KEYS
 
 st.set_page_config(page_title="Earnings Drift Backtest", layout="wide")
 
+# one data layer for the whole server process, sessions asking for the same tickers share the downloads
+@st.cache_resource
+def shared_data_layer():
+    return SharedDataLayer()
+
+# cached across sessions, the key argument is a normalized hash of the settings each stage depends on
+# so changing only the threshold reuses the loaded data and the event table
+@st.cache_resource(max_entries=8, show_spinner=False)
+def cached_market_data(key, _cfg):
+    return load_market_data(_cfg, shared_data_layer())
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def cached_events(key, _cfg):
+    return build_events(cached_market_data(config_key(_cfg, DATA_KEYS), _cfg), _cfg)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_results(key, _cfg):
+    data = cached_market_data(config_key(_cfg, DATA_KEYS), _cfg)
+    events = cached_events(config_key(_cfg, EVENT_KEYS), _cfg)
+    return run_backtest(_cfg, data, events), run_backtest_baseline(_cfg, data, events)
+
 st.title("Earnings Drift Backtest")
 
 with st.sidebar:
     st.header("Inputs")
     tickers_str = st.text_input("Tickers comma separated", value="EQIX, AVG, META, GE, HWM, UBER, APP")
+    universe = st.selectbox("Universe file, added to the tickers", ["none"] + list_universes())
     benchmark = st.text_input("Benchmark ETF", value="SPY")
     start_date = st.date_input("Start date", value=pd.to_datetime("2010-01-01")).strftime("%Y-%m-%d")
     end_date = st.date_input("End date", value=pd.to_datetime("today")).strftime("%Y-%m-%d")
     threshold = st.number_input("Three month signal threshold", value=0.00, step=0.01, format="%.2f")
     min_hist_days = st.number_input("Min price history days", value=400, step=10)
     calendar_pad = st.number_input("Calendar pad days", value=5, step=1)
+    profile_run = st.checkbox("Profile stages (skips the result cache)", value=False)
     run_btn = st.button("Run backtest")
 
 st.caption(
@@ -29,6 +54,7 @@ st.caption(
 if run_btn:
     cfg = default_config().copy()
     cfg["tickers"] = [t.strip().upper() for t in tickers_str.split(",") if t.strip()]
+    cfg["universe"] = None if universe == "none" else universe
     cfg["benchmark"] = benchmark.strip().upper()
     cfg["start_date"] = start_date
     cfg["end_date"] = end_date
@@ -38,10 +64,27 @@ if run_btn:
     cfg["plot"] = False
 
     with st.spinner("Running backtest"):
-        # אסטרטגיה ראשית
-        stats, trades, equity, bench_equity = run_backtest(cfg)
-        # אסטרטגיית בסיס
-        baseline_stats, baseline_trades, baseline_equity, _ = run_backtest_baseline(cfg)
+        # one data load and one event table for both strategies
+        # אסטרטגיה ראשית ואסטרטגיית בסיס
+        if profile_run:
+            prof = Profile()
+            with prof.stage("load"):
+                data = load_market_data(cfg, profile=prof)
+            with prof.stage("events"):
+                events = build_events(data, cfg)
+            st.session_state["results"] = (run_backtest(cfg, data, events, prof), run_backtest_baseline(cfg, data, events, prof))
+            st.session_state["profile"] = prof.frame()
+        else:
+            st.session_state["results"] = cached_results(config_key(cfg), cfg)
+            st.session_state["profile"] = None
+
+# the last results stay on screen when the page reruns without a new click
+if "results" in st.session_state:
+    (stats, trades, equity, bench_equity), (baseline_stats, baseline_trades, baseline_equity, _) = st.session_state["results"]
+
+    if st.session_state.get("profile") is not None:
+        with st.expander("Stage profile"):
+            st.dataframe(st.session_state["profile"], use_container_width=True)
 
     st.subheader("Summary")
     summary = pd.DataFrame({
@@ -85,6 +128,8 @@ if run_btn:
     st.dataframe(summary, use_container_width=True)
 
     st.subheader("Equity Curve")
+    # matplotlib loads only once there is something to plot
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(figsize=(12, 6))
     
     # Earnings Drift - ירוק מודגש + עבה + markers
@@ -1,23 +1,40 @@
 # reusable backtest engine
 # comments are in English
+import hashlib
+import json
 import math
 import numpy as np
 import pandas as pd
-import yfinance as yf
-from dateutil.relativedelta import relativedelta
+from panel import open_panel, stack_frames
+from profiling import stage
+# the provider and store modules are imported where they are used so that the core engine loads fast
 
 def default_config():
     return {
         "tickers": ["AAPL", "MSFT", "NVDA", "AMZN", "META", "AVGO", "GOOGL"],
+        "universe": None,
         "benchmark": "SPY",
         "start_date": "2010-01-01",
         "end_date": None,
         "three_month_signal_threshold": 0.00,
+        "entry_months": 3,
+        "exit_months": 12,
         "min_price_history_days": 400,
         "plot": False,
         "figure_path": "equity_curve.png",
         "results_csv": "backtest_trades_and_stats.csv",
-        "calendar_pad_days": 5
+        "calendar_pad_days": 5,
+        "price_cache_dir": "price_cache",
+        "earnings_cache_dir": "price_cache",
+        "earnings_ttl_days": 7,
+        "earnings_workers": 8,
+        "data_provider": "yfinance",
+        "data_dir": None,
+        "synthetic_seed": 0,
+        "price_dtype": "float64",
+        "panel_path": None,
+        "price_batch_size": 200,
+        "profile": False
     }
 
 def safe_end_date(end_date_str):
@@ -25,114 +42,356 @@ def safe_end_date(end_date_str):
         return pd.Timestamp.today().normalize()
     return pd.Timestamp(end_date_str)
 
-def download_prices(unique_tickers, start_date, end_date):
-    data = yf.download(unique_tickers, start=start_date, end=end_date, auto_adjust=True, progress=False)["Close"]
+# settings that change what load_market_data returns
+DATA_KEYS = ["tickers", "benchmark", "start_date", "end_date", "min_price_history_days", "calendar_pad_days",
+             "data_provider", "data_dir", "synthetic_seed", "price_dtype",
+             "panel_path", "universe"]
+# settings that change the event table on top of the data
+EVENT_KEYS = DATA_KEYS + ["entry_months", "exit_months"]
+
+def normalize_config(cfg):
+    # the same backtest always gives the same dict, whatever the ticker order or date format
+    # tickers are kept as written, loading uses them as given and providers may tell case apart
+    norm = dict(cfg)
+    norm["tickers"] = sorted(set(cfg["tickers"]))
+    norm["start_date"] = pd.Timestamp(cfg["start_date"]).date().isoformat()
+    norm["end_date"] = safe_end_date(cfg["end_date"]).date().isoformat()
+    norm["three_month_signal_threshold"] = round(float(cfg["three_month_signal_threshold"]), 10)
+    return norm
+
+def config_key(cfg, keys=None):
+    norm = normalize_config(cfg)
+    if keys is not None:
+        norm = {k: norm.get(k) for k in keys}
+    text = json.dumps(norm, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def raw_prices(unique_tickers, start_date, end_date, cache_dir=None, provider=None):
+    import providers
+    provider = provider or providers.YFinanceProvider()
+    if cache_dir and provider.cacheable:
+        import price_store
+        return price_store.load_prices(unique_tickers, start_date, end_date, cache_dir, provider.prices)
+    return provider.prices(unique_tickers, start_date, end_date)
+
+def tidy_prices(data, unique_tickers):
     if isinstance(data, pd.Series):
         data = data.to_frame()
-    return data.sort_index().ffill()
-
-def get_earnings_dates(ticker, start_date, end_date):
-    tk = yf.Ticker(ticker)
-    try:
-        df = tk.get_earnings_dates(limit=100)
-    except Exception:
-        return []
-    if df is None or df.empty:
-        return []
-    dates = df.index.tz_localize(None)
-    dates = dates[(dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))]
-    return sorted(pd.to_datetime(dates).to_pydatetime())
-
-def pct_return(series, start_dt, end_dt):
-    try:
-        s = series.loc[:end_dt].iloc[-1]
-        b = series.loc[:start_dt].iloc[-1]
-        return float(s / b - 1.0)
-    except Exception:
-        return np.nan
-
-def run_backtest(cfg):
-    tickers = list(dict.fromkeys(cfg["tickers"]))
+    return data.reindex(columns=unique_tickers).sort_index().ffill()
+
+def download_prices(unique_tickers, start_date, end_date, cache_dir=None, provider=None):
+    return tidy_prices(raw_prices(unique_tickers, start_date, end_date, cache_dir, provider), unique_tickers)
+
+def earnings_for(cfg, tickers, start_date, end_date):
+    import earnings_store
+    import providers
+    provider = providers.get_provider(cfg)
+    return earnings_store.earnings_calendar(
+        tickers, start_date, end_date, provider.earnings_dates,
+        cfg.get("earnings_cache_dir") if provider.cacheable else None,
+        ttl_days=cfg.get("earnings_ttl_days", 7), max_workers=cfg.get("earnings_workers", 8)
+    )
+
+def add_months(dates, months):
+    # same as adding relativedelta(months=n), days past the end of the target month are clipped
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    month = dates.astype("datetime64[M]")
+    day = dates - month.astype("datetime64[D]")
+    target = month + months
+    month_len = (target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")
+    return target.astype("datetime64[D]") + np.minimum(day, month_len - np.timedelta64(1, "D"))
+
+def nearest_positions(index_values, targets, first):
+    # nearest trading day at or after position first, ties go to the later day like get_indexer(method="nearest")
+    right = np.searchsorted(index_values, targets, side="left")
+    left = right - 1
+    n = len(index_values)
+    right_ok = right < n
+    left_ok = left >= first
+    right_c = np.minimum(right, n - 1)
+    left_c = np.maximum(left, 0)
+    left_dist = targets - index_values[left_c]
+    right_dist = index_values[right_c] - targets
+    use_left = left_ok & (~right_ok | (left_dist < right_dist))
+    return np.where(use_left, left_c, np.maximum(right_c, first))
+
+# traded tickers per block in the equity engine
+EQUITY_COLUMN_CHUNK = 256
+
+TRADE_COLUMNS = ["ticker", "earn_date", "entry_date", "exit_date", "r_3m", "r_hold"]
+# one trade or event, col is the panel column of the ticker and dates are int64 nanosecond datetimes
+TRADE_RECORD = np.dtype([("col", np.int32), ("earn_date", "M8[ns]"), ("entry_date", "M8[ns]"), ("exit_date", "M8[ns]"),
+                         ("r_3m", np.float64), ("r_hold", np.float64)])
+
+def signal_end_of(cfg, end_date):
+    pad_days = int(cfg.get("calendar_pad_days", 0))
+    return end_date - pd.Timedelta(days=pad_days) if pad_days > 0 else end_date
+
+def eligible_tickers(panel, tickers, min_history_days):
+    # tickers missing from a panel file have no prices
+    tickers = [tkr for tkr in tickers if tkr in panel.columns]
+    cols = panel.positions(tickers)
+    first = panel.first[cols]
+    history = (panel.dates[panel.last[cols]] - panel.dates[first]) / np.timedelta64(1, "D")
+    return [tkr for tkr, f, h in zip(tickers, first, history) if f >= 0 and h >= min_history_days]
+
+def config_tickers(cfg):
+    # the tickers of the config followed by those of its universe file
+    tickers = list(cfg["tickers"])
+    if cfg.get("universe"):
+        import universes
+        tickers += universes.load_universe(cfg["universe"])
+    return list(dict.fromkeys(tickers))
+
+def price_batches(cfg, tickers, start_date, end_date, layer=None):
+    # raw prices of at most price_batch_size tickers at a time
+    size = int(cfg.get("price_batch_size") or len(tickers) or 1)
+    for i in range(0, len(tickers), size):
+        batch = tickers[i:i + size]
+        if layer is None:
+            import providers
+            yield raw_prices(batch, start_date, end_date, cfg.get("price_cache_dir"), providers.get_provider(cfg))
+        else:
+            yield layer.prices(cfg, batch, start_date, end_date)
+
+def price_window(cfg):
+    # every ticker the config needs and the [start, end) span of prices loaded for it
+    tickers = config_tickers(cfg)
+    all_tickers = sorted(set(tickers + [cfg["benchmark"]]))
+    price_start = pd.Timestamp(cfg["start_date"]) - pd.Timedelta(days=500)
+    price_end = safe_end_date(cfg["end_date"]) + pd.Timedelta(days=2)
+    return all_tickers, price_start, price_end
+
+def load_market_data(cfg, layer=None, profile=None):
+    # prices and earnings dates for one config, shared by every strategy variant
+    # layer is an optional data_layer.SharedDataLayer serving both from memory
+    # with panel_path set the prices are mapped from a panel file written by price_store.write_panel
+    tickers = config_tickers(cfg)
     bench = cfg["benchmark"]
-    all_tickers = sorted(set(tickers + [bench]))
     end_date = safe_end_date(cfg["end_date"])
     start_date = pd.Timestamp(cfg["start_date"])
-    pad_days = int(cfg.get("calendar_pad_days", 0))
-    effective_end_for_signals = end_date - pd.Timedelta(days=pad_days) if pad_days > 0 else end_date
-
-    prices = download_prices(all_tickers, start_date - pd.Timedelta(days=500), end_date + pd.Timedelta(days=2))
-    bench_prices = prices[bench].dropna()
-
-    trade_ledger = []
-    for tkr in tickers:
-        px = prices[tkr].dropna()
-        if px.empty:
-            continue
-        if (px.index.max() - px.index.min()).days < cfg["min_price_history_days"]:
-            continue
-
-        earn_dates = get_earnings_dates(tkr, start_date, effective_end_for_signals)
-        for E in earn_dates:
-            E = pd.Timestamp(E).normalize()
-            if E < px.index.min() or E > effective_end_for_signals:
-                continue
-            entry_dt = E + relativedelta(months=3)
-            exit_dt = E + relativedelta(months=12)
-            try:
-                entry_ts = px.index[px.index.get_indexer([entry_dt], method="nearest")[0]]
-                exit_ts = px.index[px.index.get_indexer([exit_dt], method="nearest")[0]]
-            except Exception:
-                continue
-            if entry_ts >= exit_ts or entry_ts >= prices.index.max():
-                continue
-            r3m = pct_return(px, E, entry_ts)
-            if np.isnan(r3m):
-                continue
-            if r3m >= cfg["three_month_signal_threshold"]:
-                entry_price = float(px.loc[entry_ts])
-                exit_price = float(px.loc[exit_ts])
-                r_hold = float(exit_price / entry_price - 1.0)
-                trade_ledger.append({
-                    "ticker": tkr,
-                    "earn_date": E.date().isoformat(),
-                    "entry_date": pd.Timestamp(entry_ts).date().isoformat(),
-                    "exit_date": pd.Timestamp(exit_ts).date().isoformat(),
-                    "r_3m": r3m,
-                    "r_hold": r_hold
-                })
-
-    if trade_ledger:
-        trades = pd.DataFrame(trade_ledger).sort_values(["entry_date", "ticker"]).reset_index(drop=True)
-    else:
-        trades = pd.DataFrame(columns=["ticker", "earn_date", "entry_date", "exit_date", "r_3m", "r_hold"])
-
-    daily_index = prices.index[(prices.index >= start_date) & (prices.index <= end_date)]
-    equity = pd.Series(index=daily_index, dtype=float, data=1.0)
+    effective_end_for_signals = signal_end_of(cfg, end_date)
 
-    positions = []
-    for _, row in trades.iterrows():
-        seg = prices[row["ticker"]].loc[pd.Timestamp(row["entry_date"]):pd.Timestamp(row["exit_date"])].pct_change().fillna(0.0)
-        positions.append(seg)
-    if positions:
-        pos_df = pd.concat(positions, axis=1)
-        daily_ret = pos_df.mean(axis=1).reindex(daily_index).fillna(0.0)
-        equity = (1.0 + daily_ret).cumprod()
+    all_tickers, price_start, price_end = price_window(cfg)
+    with stage(profile, "prices"):
+        if cfg.get("panel_path"):
+            panel = open_panel(cfg["panel_path"]).rows(price_start, price_end)
+            if bench not in panel.columns:
+                raise ValueError(f"benchmark {bench} is not in the panel at {cfg['panel_path']}")
+        else:
+            # batches go straight into the compact panel, no frame of the whole universe is built
+            batches = price_batches(cfg, all_tickers, price_start, price_end, layer)
+            panel = stack_frames(batches, all_tickers, cfg.get("price_dtype", "float64"))
+    if len(panel.dates) == 0:
+        raise ValueError(f"no prices for any of {len(all_tickers)} tickers ({', '.join(all_tickers[:5])}"
+                         f"{', ...' if len(all_tickers) > 5 else ''}) from the {cfg.get('data_provider', 'yfinance')} provider "
+                         f"between {price_start.date()} and {price_end.date()}")
+    calendar_for = earnings_for if layer is None else layer.calendar
+    eligible = eligible_tickers(panel, tickers, cfg["min_price_history_days"])
+    with stage(profile, "earnings"):
+        calendar = calendar_for(cfg, eligible, start_date, effective_end_for_signals)
+
+    return {
+        "tickers": tickers,
+        "benchmark": bench,
+        "start_date": start_date,
+        "end_date": end_date,
+        "panel": panel,
+        "calendar": calendar
+    }
+
+def resolve_events(data, cfg):
+    # earnings events of eligible tickers inside the signal window with their trading calendar positions
+    panel = data["panel"]
+    eligible = eligible_tickers(panel, data["tickers"], cfg["min_price_history_days"])
+    signal_end = np.datetime64(signal_end_of(cfg, data["end_date"]), "ns")
+    index_values = panel.dates
+    first = panel.first
+
+    # cols are panel columns so prices are gathered straight from the shared matrix
+    cols = [np.zeros(0, dtype=np.int64)]
+    announced = [np.zeros(0, dtype="datetime64[ns]")]
+    for tkr in eligible:
+        col = panel.columns[tkr]
+        dates = pd.DatetimeIndex(data["calendar"].get(tkr, []))
+        cols.append(np.full(len(dates), col, dtype=np.int64))
+        announced.append(dates.values.astype("datetime64[ns]"))
+    cols = np.concatenate(cols)
+    announced = np.concatenate(announced)
+    earn = announced.astype("datetime64[D]").astype("datetime64[ns]")
+
+    keep = (announced <= signal_end) & (earn >= index_values[first[cols]]) & (earn <= signal_end)
+    cols = cols[keep]
+    earn = earn[keep]
+    return {
+        "tickers": panel.tickers,
+        "values": panel.values,
+        "index_values": index_values,
+        "cols": cols,
+        "earn": earn,
+        "first": first[cols],
+        "earn_pos": np.searchsorted(index_values, earn, side="right") - 1
+    }
+
+def trade_horizons(cfg):
+    # entry and exit months of a single backtest, lists of horizons only go through horizon_cube
+    months = [cfg.get("entry_months", 3), cfg.get("exit_months", 12)]
+    for key, m in zip(["entry_months", "exit_months"], months):
+        if np.ndim(m) != 0:
+            raise ValueError(f"{key} must be a single number for a backtest, use horizon_cube for a list of horizons")
+    return months
+
+def horizon_positions(resolved, months):
+    # nearest trading day position of every event at every horizon in one searchsorted, shape (events, horizons)
+    months = np.asarray(months, dtype=np.int64)
+    earn = resolved["earn"]
+    targets = add_months(earn[:, None], months[None, :]).astype("datetime64[ns]")
+    first = np.repeat(resolved["first"], len(months))
+    return nearest_positions(resolved["index_values"], targets.ravel(), first).reshape(len(earn), len(months))
+
+def event_records(resolved, entry_pos, exit_pos):
+    # events as one structured array in (entry date, ticker) order, see TRADE_RECORD
+    index_values = resolved["index_values"]
+    values = resolved["values"]
+    keep = (entry_pos < exit_pos) & (entry_pos < len(index_values) - 1)
+    cols, earn, earn_pos = resolved["cols"][keep], resolved["earn"][keep], resolved["earn_pos"][keep]
+    entry_pos, exit_pos = entry_pos[keep], exit_pos[keep]
+
+    names = np.asarray(resolved["tickers"], dtype=object)[cols]
+    order = np.lexsort((names.astype(str), entry_pos))
+    cols, earn, entry_pos, exit_pos, earn_pos = (a[order] for a in (cols, earn, entry_pos, exit_pos, earn_pos))
+
+    records = np.empty(len(cols), dtype=TRADE_RECORD)
+    entry_price = values[entry_pos, cols].astype(float)
+    records["col"] = cols
+    records["earn_date"] = earn
+    records["entry_date"] = index_values[entry_pos]
+    records["exit_date"] = index_values[exit_pos]
+    records["r_3m"] = entry_price / values[earn_pos, cols] - 1.0
+    records["r_hold"] = values[exit_pos, cols] / entry_price - 1.0
+    return records
+
+def records_frame(records, tickers):
+    return pd.DataFrame({
+        "ticker": np.asarray(tickers, dtype=object)[records["col"]],
+        "earn_date": records["earn_date"],
+        "entry_date": records["entry_date"],
+        "exit_date": records["exit_date"],
+        "r_3m": records["r_3m"],
+        "r_hold": records["r_hold"]
+    }, columns=TRADE_COLUMNS)
+
+def events_frame(resolved, entry_pos, exit_pos):
+    return records_frame(event_records(resolved, entry_pos, exit_pos), resolved["tickers"])
+
+def iter_events(data, cfg, batch_size=65536, signal=False):
+    # events, or with signal the trades, as structured array batches in (entry date, ticker) order
+    # only the position arrays of the events are held, batches are built as they are consumed
+    resolved = resolve_events(data, cfg)
+    pos = horizon_positions(resolved, trade_horizons(cfg))
+    keep = (pos[:, 0] < pos[:, 1]) & (pos[:, 0] < len(resolved["index_values"]) - 1)
+    names = np.asarray(resolved["tickers"], dtype=object)[resolved["cols"]].astype(str)
+    order = np.flatnonzero(keep)[np.lexsort((names[keep], pos[keep, 0]))]
+    for i in range(0, len(order), batch_size):
+        part = order[i:i + batch_size]
+        sub = dict(resolved, cols=resolved["cols"][part], earn=resolved["earn"][part], earn_pos=resolved["earn_pos"][part])
+        records = event_records(sub, pos[part, 0], pos[part, 1])
+        if signal:
+            records = records[records["r_3m"] >= cfg["three_month_signal_threshold"]]
+        yield records
+
+def iter_trades(data, cfg, batch_size=65536):
+    return iter_events(data, cfg, batch_size, signal=True)
 
+def build_events(data, cfg):
+    # every earnings event with its entry, exit and returns, before any signal filter
+    # all events are resolved at once against the trading calendar with searchsorted
+    resolved = resolve_events(data, cfg)
+    pos = horizon_positions(resolved, trade_horizons(cfg))
+    return events_frame(resolved, pos[:, 0], pos[:, 1])
+
+def signal_trades(events, cfg):
+    return events[events["r_3m"] >= cfg["three_month_signal_threshold"]].reset_index(drop=True)
+
+def price_returns(values):
+    # dense day over day return matrix, zero where a ticker has no price yet
+    values = np.asarray(values, dtype=float)
+    returns = np.zeros_like(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[1:] = values[1:] / values[:-1] - 1.0
+    returns[~np.isfinite(returns)] = 0.0
+    return returns
+
+def trade_positions(trades, panel):
+    # panel column, entry row and exit row of every trade
+    index_values = panel.dates
+    cols = panel.positions(trades["ticker"])
+    entry = np.searchsorted(index_values, pd.to_datetime(trades["entry_date"]).values.astype("datetime64[ns]"))
+    exit_ = np.searchsorted(index_values, pd.to_datetime(trades["exit_date"]).values.astype("datetime64[ns]"))
+    return cols, entry, exit_
+
+def position_sums(trades, panel, returns=None, chunk=EQUITY_COLUMN_CHUNK):
+    # summed return and count of open positions per day, a position is open from its entry day to its exit day
+    # and earns nothing on the entry day
+    cols, entry, exit_ = trade_positions(trades, panel)
+    return open_sums(cols, entry, exit_, panel, returns, chunk)
+
+def open_sums(cols, entry, exit_, panel, returns=None, chunk=EQUITY_COLUMN_CHUNK):
+    # position_sums on panel columns and entry and exit rows
+    # without a shared return matrix only the traded columns are turned into returns
+    n = len(panel.dates)
+    # only the traded tickers get a column, open counts come from cumulative start and stop events
+    # columns are taken a block at a time so memory does not grow with the universe
+    traded, cols = np.unique(cols, return_inverse=True)
+    total = np.zeros(n)
+    count = np.zeros(n, dtype=np.int64)
+    for c0 in range(0, len(traded), chunk):
+        block = traded[c0:c0 + chunk]
+        in_block = (cols >= c0) & (cols < c0 + chunk)
+        e, x, c = entry[in_block], exit_[in_block], cols[in_block] - c0
+        held = np.zeros((n + 1, len(block)), dtype=np.int32)
+        np.add.at(held, (e, c), 1)
+        np.add.at(held, (x + 1, c), -1)
+        held = np.cumsum(held[:n], axis=0)
+
+        block_returns = returns[:, block] if returns is not None else price_returns(panel.values[:, block])
+        total += (block_returns * held).sum(axis=1) - np.bincount(e, weights=block_returns[e, c], minlength=n)
+        count += held.sum(axis=1)
+    return total, count
+
+def position_returns(trades, panel, returns=None):
+    # equal weight daily return over all open positions, days without positions are NaN
+    total, count = position_sums(trades, panel, returns)
+    daily = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    return pd.Series(daily, index=panel.index)
+
+def sharpe(returns, freq=252):
+    mu = returns.mean() * freq
+    sig = returns.std(ddof=0) * math.sqrt(freq)
+    return float(mu / sig) if sig > 0 else np.nan
+
+def daily_index_of(data):
+    index = data["panel"].index
+    return index[(index >= data["start_date"]) & (index <= data["end_date"])]
+
+def benchmark_equity(data, daily_index):
+    bench_prices = data["panel"].series(data["benchmark"]).dropna()
     bench_seg = bench_prices.reindex(daily_index).ffill().pct_change().fillna(0.0)
-    bench_equity = (1.0 + bench_seg).cumprod()
+    return (1.0 + bench_seg).cumprod()
 
-    def sharpe(returns, freq=252):
-        mu = returns.mean() * freq
-        sig = returns.std(ddof=0) * math.sqrt(freq)
-        return float(mu / sig) if sig > 0 else np.nan
+def trade_summary(r_hold):
+    r_hold = pd.Series(r_hold, dtype=float)
+    return {
+        "trades": int(len(r_hold)),
+        "win_rate": float((r_hold > 0).mean()) if len(r_hold) else np.nan,
+        "avg_trade_return": float(r_hold.mean()) if len(r_hold) else np.nan,
+        "median_trade_return": float(r_hold.median()) if len(r_hold) else np.nan
+    }
 
+def curve_summary(equity, bench_equity):
     bt_ret = equity.pct_change().dropna()
     bm_ret = bench_equity.pct_change().dropna()
-    stats = {
-        "trades": int(len(trades)),
-        "win_rate": float((trades["r_hold"] > 0).mean()) if len(trades) else np.nan,
-        "avg_trade_return": float(trades["r_hold"].mean()) if len(trades) else np.nan,
-        "median_trade_return": float(trades["r_hold"].median()) if len(trades) else np.nan,
+    return {
         "equity_cagr": float((equity.iloc[-1]) ** (252.0 / len(equity)) - 1.0) if len(equity) > 1 else np.nan,
         "bench_cagr": float((bench_equity.iloc[-1]) ** (252.0 / len(bench_equity)) - 1.0) if len(bench_equity) > 1 else np.nan,
         "sharpe": sharpe(bt_ret),
@@ -141,93 +400,110 @@ def run_backtest(cfg):
         "bench_max_drawdown": float(((bench_equity / bench_equity.cummax()) - 1.0).min()) if len(bench_equity) else np.nan
     }
 
-    return stats, trades, equity, bench_equity
+def summary_stats(trades, equity, bench_equity):
+    return {**trade_summary(trades["r_hold"].to_numpy()), **curve_summary(equity, bench_equity)}
 
-def run_backtest_baseline(cfg):
-    tickers = list(dict.fromkeys(cfg["tickers"]))
-    bench = cfg["benchmark"]
-    all_tickers = sorted(set(tickers + [bench]))
-    end_date = safe_end_date(cfg["end_date"])
-    start_date = pd.Timestamp(cfg["start_date"])
-    pad_days = int(cfg.get("calendar_pad_days", 0))
-    effective_end_for_signals = end_date - pd.Timedelta(days=pad_days) if pad_days > 0 else end_date
-
-    prices = download_prices(all_tickers, start_date - pd.Timedelta(days=500), end_date + pd.Timedelta(days=2))
-    bench_prices = prices[bench].dropna()
-
-    trade_ledger = []
-    for tkr in tickers:
-        px = prices[tkr].dropna()
-        if px.empty:
-            continue
-        if (px.index.max() - px.index.min()).days < cfg["min_price_history_days"]:
-            continue
-
-        earn_dates = get_earnings_dates(tkr, start_date, effective_end_for_signals)
-        for E in earn_dates:
-            E = pd.Timestamp(E).normalize()
-            if E < px.index.min() or E > effective_end_for_signals:
-                continue
-            entry_dt = E + relativedelta(months=3)
-            exit_dt = E + relativedelta(months=12)
-            try:
-                entry_ts = px.index[px.index.get_indexer([entry_dt], method="nearest")[0]]
-                exit_ts = px.index[px.index.get_indexer([exit_dt], method="nearest")[0]]
-            except Exception:
-                continue
-            if entry_ts >= exit_ts or entry_ts >= prices.index.max():
-                continue
-            entry_price = float(px.loc[entry_ts])
-            exit_price = float(px.loc[exit_ts])
-            r_3m = pct_return(px, E, entry_ts)
-            r_hold = float(exit_price / entry_price - 1.0)
-            trade_ledger.append({
-                "ticker": tkr,
-                "earn_date": E.date().isoformat(),
-                "entry_date": pd.Timestamp(entry_ts).date().isoformat(),
-                "exit_date": pd.Timestamp(exit_ts).date().isoformat(),
-                "r_3m": r_3m,
-                "r_hold": r_hold
-            })
-
-    if trade_ledger:
-        trades = pd.DataFrame(trade_ledger).sort_values(["entry_date", "ticker"]).reset_index(drop=True)
-    else:
-        trades = pd.DataFrame(columns=["ticker", "earn_date", "entry_date", "exit_date", "r_3m", "r_hold"])
-
-    daily_index = prices.index[(prices.index >= start_date) & (prices.index <= end_date)]
+def equity_curves(trades, data):
+    daily_index = daily_index_of(data)
     equity = pd.Series(index=daily_index, dtype=float, data=1.0)
 
-    positions = []
-    for _, row in trades.iterrows():
-        seg = prices[row["ticker"]].loc[pd.Timestamp(row["entry_date"]):pd.Timestamp(row["exit_date"])].pct_change().fillna(0.0)
-        positions.append(seg)
-    if positions:
-        pos_df = pd.concat(positions, axis=1)
-        daily_ret = pos_df.mean(axis=1).reindex(daily_index).fillna(0.0)
+    if len(trades):
+        daily_ret = position_returns(trades, data["panel"], data.get("returns")).reindex(daily_index).fillna(0.0)
         equity = (1.0 + daily_ret).cumprod()
 
-    bench_seg = bench_prices.reindex(daily_index).ffill().pct_change().fillna(0.0)
-    bench_equity = (1.0 + bench_seg).cumprod()
+    return equity, benchmark_equity(data, daily_index)
 
-    def sharpe(returns, freq=252):
-        mu = returns.mean() * freq
-        sig = returns.std(ddof=0) * math.sqrt(freq)
-        return float(mu / sig) if sig > 0 else np.nan
+def evaluate(trades, data):
+    equity, bench_equity = equity_curves(trades, data)
+    return summary_stats(trades, equity, bench_equity), equity, bench_equity
 
-    bt_ret = equity.pct_change().dropna()
-    bm_ret = bench_equity.pct_change().dropna()
-    stats = {
-        "trades": int(len(trades)),
-        "win_rate": float((trades["r_hold"] > 0).mean()) if len(trades) else np.nan,
-        "avg_trade_return": float(trades["r_hold"].mean()) if len(trades) else np.nan,
-        "median_trade_return": float(trades["r_hold"].median()) if len(trades) else np.nan,
-        "equity_cagr": float((equity.iloc[-1]) ** (252.0 / len(equity)) - 1.0) if len(equity) > 1 else np.nan,
-        "bench_cagr": float((bench_equity.iloc[-1]) ** (252.0 / len(bench_equity)) - 1.0) if len(bench_equity) > 1 else np.nan,
-        "sharpe": sharpe(bt_ret),
-        "bench_sharpe": sharpe(bm_ret),
-        "max_drawdown": float(((equity / equity.cummax()) - 1.0).min()) if len(equity) else np.nan,
-        "bench_max_drawdown": float(((bench_equity / bench_equity.cummax()) - 1.0).min()) if len(bench_equity) else np.nan
-    }
+def run_stages(cfg, data, events, profile, select):
+    if data is None:
+        with stage(profile, "load"):
+            data = load_market_data(cfg, profile=profile)
+    if events is None:
+        with stage(profile, "events"):
+            events = build_events(data, cfg)
+    with stage(profile, "signal"):
+        trades = select(events)
+    with stage(profile, "equity"):
+        equity, bench_equity = equity_curves(trades, data)
+    with stage(profile, "stats"):
+        stats = summary_stats(trades, equity, bench_equity)
+    return stats, trades, equity, bench_equity
+
+def run_backtest(cfg, data=None, events=None, profile=None):
+    # pass data and events from an earlier call to skip loading and event building
+    # pass a profiling.Profile to have the per stage times and memory recorded in it
+    return run_stages(cfg, data, events, profile, lambda ev: signal_trades(ev, cfg))
+
+def run_backtest_baseline(cfg, data=None, events=None, profile=None):
+    # every earnings event is traded regardless of the three month return
+    return run_stages(cfg, data, events, profile, lambda ev: ev)
+
+def sweep_thresholds(cfg, thresholds, data=None, events=None):
+    # every threshold from one event table and one return matrix
+    # events are bucketed by the highest threshold they pass, so each bucket is added to the open position sums once
+    # and the sums for a lower threshold are the running total of all buckets above it
+    data = data if data is not None else load_market_data(cfg)
+    events = events if events is not None else build_events(data, cfg)
+    thresholds = np.unique(np.asarray(thresholds, dtype=float))
+    panel = data["panel"]
+    daily_index = daily_index_of(data)
+    bench_equity = benchmark_equity(data, daily_index)
+    returns = data["returns"] if data.get("returns") is not None else price_returns(panel.values)
+
+    r3m = events["r_3m"].to_numpy(dtype=float)
+    bucket = np.where(np.isnan(r3m), 0, np.searchsorted(thresholds, r3m, side="right"))
+    total = np.zeros(len(panel.dates))
+    count = np.zeros(len(panel.dates))
+    daily = np.zeros((len(daily_index), len(thresholds)))
+    for k in range(len(thresholds) - 1, -1, -1):
+        members = events[bucket == k + 1]
+        if len(members):
+            t, c = position_sums(members, panel, returns)
+            total += t
+            count += c
+        ret = pd.Series(np.where(count > 0, total / np.maximum(count, 1), np.nan), index=panel.index)
+        daily[:, k] = ret.reindex(daily_index).fillna(0.0).to_numpy()
 
+    equity = pd.DataFrame(np.cumprod(1.0 + daily, axis=0), index=daily_index, columns=pd.Index(thresholds, name="threshold"))
+    trades = {}
+    rows = []
+    for k, th in enumerate(thresholds):
+        trades[th] = events[bucket >= k + 1].reset_index(drop=True)
+        rows.append(summary_stats(trades[th], equity[th], bench_equity))
+    stats = pd.DataFrame(rows, index=equity.columns)
     return stats, trades, equity, bench_equity
+
+def horizon_cube(cfg, data=None):
+    # stats for every entry and exit horizon pair from one data load
+    # entry_months and exit_months may be lists, pairs with the exit not after the entry are skipped
+    entries = [int(m) for m in np.atleast_1d(cfg.get("entry_months", 3))]
+    exits = [int(m) for m in np.atleast_1d(cfg.get("exit_months", 12))]
+    data = data if data is not None else load_market_data(cfg)
+    if data.get("returns") is None:
+        data = dict(data, returns=price_returns(data["panel"].values))
+
+    resolved = resolve_events(data, cfg)
+    months = sorted(set(entries) | set(exits))
+    pos = horizon_positions(resolved, months)
+    col = {m: i for i, m in enumerate(months)}
+
+    keys = []
+    rows = []
+    for entry in entries:
+        for exit_ in exits:
+            if exit_ <= entry:
+                continue
+            events = events_frame(resolved, pos[:, col[entry]], pos[:, col[exit_]])
+            stats, _, _ = evaluate(signal_trades(events, cfg), data)
+            keys.append((entry, exit_))
+            rows.append(stats)
+    index = pd.MultiIndex.from_tuples(keys, names=["entry_months", "exit_months"])
+    return pd.DataFrame(rows, index=index)
+
+if __name__ == "__main__":
+    import sys
+    import cli
+    sys.exit(cli.main())
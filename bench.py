@@ -0,0 +1,132 @@
+# benchmark harness for the backtest engine
+# synthetic universes, no network, every stage of run_backtest timed on its own
+# python bench.py run --scales small medium --repeat 3 --out bench.json
+# python bench.py compare old.json new.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import backtest
+
+# name -> (tickers, years)
+SCALES = {
+    "small": (10, 5),
+    "medium": (500, 20),
+    "large": (5000, 30)
+}
+BENCH_END_DATE = "2024-12-31"
+STAGES = ["load", "events", "signal", "equity", "stats"]
+
+def synthetic_config(n_tickers, years, seed=0):
+    cfg = backtest.default_config()
+    cfg["tickers"] = [f"SYN{i:04d}" for i in range(n_tickers)]
+    cfg["benchmark"] = "SYNBENCH"
+    cfg["end_date"] = BENCH_END_DATE
+    cfg["start_date"] = (pd.Timestamp(BENCH_END_DATE) - pd.DateOffset(years=years)).date().isoformat()
+    cfg["data_provider"] = "synthetic"
+    cfg["synthetic_seed"] = seed
+    return cfg
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t
+
+def run_once(cfg):
+    times = {}
+    data, times["load"] = timed(backtest.load_market_data, cfg)
+    events, times["events"] = timed(backtest.build_events, data, cfg)
+    trades, times["signal"] = timed(backtest.signal_trades, events, cfg)
+    (equity, bench_equity), times["equity"] = timed(backtest.equity_curves, trades, data)
+    stats, times["stats"] = timed(backtest.summary_stats, trades, equity, bench_equity)
+    sizes = {"days": len(data["panel"].dates), "tickers": len(data["tickers"]), "events": len(events), "trades": len(trades)}
+    return times, sizes, stats
+
+def bench_scale(name, repeat, seed=0):
+    n_tickers, years = SCALES[name]
+    cfg = synthetic_config(n_tickers, years, seed)
+    runs = []
+    for _ in range(repeat):
+        times, sizes, stats = run_once(cfg)
+        runs.append(times)
+    stages = {}
+    for stage in STAGES + ["total"]:
+        values = [sum(r.values()) if stage == "total" else r[stage] for r in runs]
+        stages[stage] = {"min": min(values), "median": float(np.median(values)), "runs": values}
+    return {"tickers": n_tickers, "years": years, "sizes": sizes, "stages": stages, "stats": stats}
+
+def git_commit():
+    # the commit of the checkout bench.py lives in, wherever it is run from
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+def run_bench(scales, repeat, seed=0):
+    result = {
+        "commit": git_commit(),
+        "created": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "seed": seed,
+        "scales": {}
+    }
+    for name in scales:
+        result["scales"][name] = bench_scale(name, repeat, seed)
+        stages = result["scales"][name]["stages"]
+        line = " ".join(f"{stage} {stages[stage]['min']:.3f}s" for stage in STAGES + ["total"])
+        print(f"{name}: {line}", file=sys.stderr)
+    return result
+
+def compare(old, new):
+    # min time per stage of two result files, ratio below 1 means the new run is faster
+    rows = []
+    for name, scale in new["scales"].items():
+        if name not in old["scales"]:
+            continue
+        for stage in STAGES + ["total"]:
+            before = old["scales"][name]["stages"][stage]["min"]
+            after = scale["stages"][stage]["min"]
+            rows.append({"scale": name, "stage": stage, "old": before, "new": after, "ratio": after / before if before > 0 else np.nan})
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python bench.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="time every stage on synthetic universes")
+    run.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--out", help="json file for the results, printed when missing")
+    cmp = sub.add_parser("compare", help="compare two result files")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        result = run_bench(args.scales, args.repeat, args.seed)
+        text = json.dumps(result, indent=2)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        print(compare(old, new).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# headless command line entry point
+# python -m backtest run --config cfg.json --out results
+# the config file holds one config object, a list of them or one object per line, keys missing from a config come from default_config
+import argparse
+import json
+import os
+import subprocess
+import sys
+import pandas as pd
+import backtest
+from data_layer import SharedDataLayer
+from profiling import Profile
+
+# cold import budget for the engine modules, measured in a fresh interpreter by the importtime command
+CORE_MODULES = ["backtest", "grid", "cli"]
+IMPORT_BUDGET_SECONDS = 1.0
+# modules the engine must not pull in at import time
+HEAVY_MODULES = ["yfinance", "matplotlib", "streamlit"]
+
+def measure_import(module, runs=5):
+    # best of several fresh interpreters, returns seconds and the heavy modules that got loaded
+    code = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - t)\n"
+        "print(','.join(sorted({name.split('.')[0] for name in sys.modules})))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    loaded = set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True).stdout.split("\n")
+        best = float(out[0]) if best is None else min(best, float(out[0]))
+        loaded = {m for m in out[1].split(",") if m in HEAVY_MODULES}
+    return best, sorted(loaded)
+
+def check_imports(modules, budget, runs):
+    ok = True
+    for module in modules:
+        seconds, heavy = measure_import(module, runs)
+        status = "ok" if seconds <= budget and not heavy else "FAIL"
+        ok = ok and status == "ok"
+        extra = f" loads {', '.join(heavy)}" if heavy else ""
+        print(f"{module}: {seconds:.3f}s budget {budget:.3f}s {status}{extra}")
+    return ok
+
+def read_configs(path):
+    with open(path) as f:
+        text = f.read()
+    try:
+        loaded = json.loads(text)
+    except json.JSONDecodeError:
+        loaded = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(loaded, dict):
+        loaded = [loaded]
+    configs = []
+    for i, item in enumerate(loaded):
+        cfg = backtest.default_config()
+        cfg.update(item)
+        cfg.setdefault("name", f"run{i:03d}")
+        configs.append(cfg)
+    return configs
+
+def write_frame(frame, path, fmt, index):
+    if fmt == "parquet":
+        frame.to_parquet(os.path.splitext(path)[0] + ".parquet", index=index)
+    else:
+        frame.to_csv(path, index=index)
+
+def plot_equity(equity, bench_equity, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 6))
+    equity.plot(ax=ax, label="Earnings Drift Strategy")
+    bench_equity.plot(ax=ax, label="Benchmark", linestyle="--")
+    ax.set_ylabel("Portfolio Value")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+def run_configs(configs, out_dir, fmt="csv"):
+    # configs with the same data settings share one load, all loads share one in memory data layer
+    layer = SharedDataLayer()
+    loaded = {}
+    rows = []
+    for cfg in configs:
+        key = backtest.config_key(cfg, backtest.DATA_KEYS)
+        if key not in loaded:
+            loaded[key] = backtest.load_market_data(cfg, layer)
+        prof = Profile() if cfg.get("profile") else None
+        stats, trades, equity, bench_equity = backtest.run_backtest(cfg, loaded[key], profile=prof)
+
+        run_dir = os.path.join(out_dir, cfg["name"])
+        os.makedirs(run_dir, exist_ok=True)
+        write_frame(trades, os.path.join(run_dir, cfg["results_csv"]), fmt, index=False)
+        curves = pd.DataFrame({"equity": equity, "bench_equity": bench_equity})
+        curves.index.name = "date"
+        write_frame(curves, os.path.join(run_dir, "equity.csv"), fmt, index=True)
+        with open(os.path.join(run_dir, "stats.json"), "w") as f:
+            json.dump(stats, f, indent=2)
+        if prof is not None:
+            write_frame(prof.frame(), os.path.join(run_dir, "profile.csv"), fmt, index=False)
+        if cfg.get("plot"):
+            plot_equity(equity, bench_equity, os.path.join(run_dir, cfg["figure_path"]))
+        rows.append({"name": cfg["name"], **stats})
+        print(f"{cfg['name']}: {stats['trades']} trades, cagr {stats['equity_cagr']:.2%}, sharpe {stats['sharpe']:.2f}")
+
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(out_dir, "stats.csv"), index=False)
+    return summary
+
+def write_panel(configs, path):
+    # one panel wide enough for every config, remote prices go through the price store first
+    import providers
+    import price_store
+    from panel import PricePanel, save_panel
+    cfg = configs[0]
+    windows = [backtest.price_window(c) for c in configs]
+    tickers = sorted(set().union(*(w[0] for w in windows)))
+    start = min(w[1] for w in windows)
+    end = max(w[2] for w in windows)
+    provider = providers.get_provider(cfg)
+    dtype = cfg.get("price_dtype", "float64")
+    if provider.cacheable and cfg.get("price_cache_dir"):
+        price_store.load_prices(tickers, start, end, cfg["price_cache_dir"], provider.prices)
+        panel = price_store.write_panel(tickers, cfg["price_cache_dir"], path, dtype)
+    else:
+        panel = PricePanel.from_frame(backtest.download_prices(tickers, start, end, None, provider), dtype)
+        save_panel(panel, path)
+    print(f"{path}: {len(panel.dates)} days, {len(panel.tickers)} tickers, {panel.nbytes / 1024 ** 2:.1f} MB")
+    return panel
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backtest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run one or many backtest configs")
+    run.add_argument("--config", required=True, help="json file with one config, a list of configs or one config per line")
+    run.add_argument("--out", default="results", help="output directory, one sub directory per config name")
+    run.add_argument("--format", choices=["csv", "parquet"], default="csv", help="file format for trades and equity")
+    panel = sub.add_parser("panel", help="write a memory mapped price panel for the tickers of the configs")
+    panel.add_argument("--config", required=True, help="json file with one config, a list of configs or one config per line")
+    panel.add_argument("--out", required=True, help="panel directory, use it as panel_path in later configs")
+    live = sub.add_parser("live", help="apply the trading days since the last update to a live state")
+    live.add_argument("--config", required=True, help="json file with one config, end_date is usually left empty for today")
+    live.add_argument("--state", required=True, help="state directory, created by the first update")
+    check = sub.add_parser("livecheck", help="replay live updates day by day and compare the curve with a full backtest")
+    check.add_argument("--config", required=True, help="json file with one config, the replay ends at its end_date")
+    check.add_argument("--since", required=True, help="end date of the first update, the following trading days are replayed")
+    check.add_argument("--tolerance", type=float, default=1e-9, help="largest equity difference allowed")
+    scan = sub.add_parser("scan", help="list upcoming entries and open positions as of the last trading day")
+    scan.add_argument("--config", required=True, help="json file with one config, end_date is usually left empty for today")
+    scan.add_argument("--days", type=int, default=10, help="calendar days ahead to look for entries")
+    scan.add_argument("--out", help="directory for upcoming.csv and open.csv, printed when missing")
+    imports = sub.add_parser("importtime", help="check the cold import time of the engine modules")
+    imports.add_argument("--module", action="append", help="module to measure, repeatable, defaults to the core modules")
+    imports.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="seconds allowed per module")
+    imports.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "importtime":
+        return 0 if check_imports(args.module or CORE_MODULES, args.budget, args.runs) else 1
+
+    if args.command == "panel":
+        write_panel(read_configs(args.config), args.out)
+        return 0
+
+    if args.command == "live":
+        import live as live_mode
+        configs = read_configs(args.config)
+        if len(configs) != 1:
+            parser.error("live takes exactly one config")
+        state, rows = live_mode.update(args.state, configs[0])
+        print(f"{state['last_date']}: equity {state['equity']:.4f}, bench {state['bench_equity']:.4f}, "
+              f"{len(state['open'])} open, {len(state['pending'])} pending, {len(rows)} new rows")
+        return 0
+
+    if args.command == "livecheck":
+        import live as live_mode
+        configs = read_configs(args.config)
+        if len(configs) != 1:
+            parser.error("livecheck takes exactly one config")
+        result = live_mode.check(configs[0], args.since)
+        ok = result["equity"] <= args.tolerance and result["bench_equity"] <= args.tolerance
+        print(f"{result['days']} days replayed, equity diff {result['equity']:.3g}, bench diff {result['bench_equity']:.3g} "
+              f"{'ok' if ok else 'FAIL'}")
+        return 0 if ok else 1
+
+    if args.command == "scan":
+        import live as live_mode
+        configs = read_configs(args.config)
+        if len(configs) != 1:
+            parser.error("scan takes exactly one config")
+        upcoming, held = live_mode.scan(configs[0], days=args.days)
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            upcoming.to_csv(os.path.join(args.out, "upcoming.csv"), index=False)
+            held.to_csv(os.path.join(args.out, "open.csv"), index=False)
+        print(f"upcoming entries in the next {args.days} days: {len(upcoming)}, {int(upcoming['passes'].sum())} passing")
+        print(upcoming.to_string(index=False))
+        print(f"open positions: {len(held)}")
+        print(held.to_string(index=False))
+        return 0
+
+    if args.command == "run":
+        configs = read_configs(args.config)
+        names = [cfg["name"] for cfg in configs]
+        if len(set(names)) != len(names):
+            parser.error("config names must be unique")
+        os.makedirs(args.out, exist_ok=True)
+        run_configs(configs, args.out, args.format)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
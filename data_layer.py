@@ -0,0 +1,152 @@
+# process wide market data layer
+# one instance serves every streamlit session: per ticker prices and earnings dates are kept in bounded lru maps
+# and concurrent requests for the same ticker wait on a single in flight fetch instead of downloading it again
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import pandas as pd
+import backtest
+import providers
+
+SOURCE_KEYS = ["data_provider", "data_dir", "synthetic_seed"]
+
+def source_key(cfg):
+    return tuple(str(cfg.get(k)) for k in SOURCE_KEYS)
+
+class SharedDataLayer:
+    def __init__(self, max_price_bytes=512 * 1024 ** 2, max_earnings_tickers=10000):
+        self.max_price_bytes = max_price_bytes
+        self.max_earnings_tickers = max_earnings_tickers
+        self.lock = threading.Lock()
+        # (source, ticker) -> (series, start, end) with the series covering [start, end)
+        self.price_cache = OrderedDict()
+        self.price_bytes = 0
+        # (source, ticker) -> (start, end, future) for price fetches in progress
+        self.price_inflight = {}
+        # (source, ticker) -> (dates, loaded at)
+        self.earnings_cache = OrderedDict()
+        self.earnings_inflight = {}
+        self.counters = {"price_hits": 0, "price_waits": 0, "price_fetches": 0, "earnings_hits": 0, "earnings_waits": 0, "earnings_fetches": 0}
+
+    def _store_price(self, key, entry):
+        old = self.price_cache.pop(key, None)
+        if old is not None:
+            self.price_bytes -= old[0].memory_usage(index=True)
+        self.price_cache[key] = entry
+        self.price_bytes += entry[0].memory_usage(index=True)
+        while self.price_bytes > self.max_price_bytes and len(self.price_cache) > 1:
+            _, dropped = self.price_cache.popitem(last=False)
+            self.price_bytes -= dropped[0].memory_usage(index=True)
+
+    def prices(self, cfg, tickers, start, end):
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        source = source_key(cfg)
+        found = {}
+        waits = {}
+        own = {}
+        with self.lock:
+            for tkr in tickers:
+                key = (source, tkr)
+                entry = self.price_cache.get(key)
+                if entry is not None and entry[1] <= start and entry[2] >= end:
+                    self.price_cache.move_to_end(key)
+                    found[tkr] = entry[0]
+                    self.counters["price_hits"] += 1
+                    continue
+                flight = self.price_inflight.get(key)
+                if flight is not None and flight[0] <= start and flight[1] >= end:
+                    waits[tkr] = flight[2]
+                    self.counters["price_waits"] += 1
+                    continue
+                # widen to what is already held so the new entry replaces the old one
+                fetch_start = min(start, entry[1]) if entry is not None else start
+                fetch_end = max(end, entry[2]) if entry is not None else end
+                own[tkr] = (fetch_start, fetch_end, Future())
+                self.price_inflight[key] = own[tkr]
+
+        if own:
+            self._fetch_prices(cfg, source, own)
+        for tkr, (_, _, future) in own.items():
+            found[tkr] = future.result()
+        for tkr, future in waits.items():
+            found[tkr] = future.result()
+
+        cols = {tkr: s[(s.index >= start) & (s.index < end)] for tkr, s in found.items()}
+        return pd.DataFrame(cols).reindex(columns=list(tickers))
+
+    def _fetch_prices(self, cfg, source, own):
+        # one provider call per distinct range, normally a single call for the whole batch
+        groups = {}
+        for tkr, (fetch_start, fetch_end, _) in own.items():
+            groups.setdefault((fetch_start, fetch_end), []).append(tkr)
+        for (fetch_start, fetch_end), group in groups.items():
+            try:
+                frame = backtest.raw_prices(group, fetch_start, fetch_end, cfg.get("price_cache_dir"), providers.get_provider(cfg))
+                frame = backtest.tidy_prices(frame, group)
+            except Exception as exc:
+                with self.lock:
+                    for tkr in group:
+                        self.price_inflight.pop((source, tkr), None)
+                        own[tkr][2].set_exception(exc)
+                continue
+            with self.lock:
+                self.counters["price_fetches"] += 1
+                for tkr in group:
+                    series = frame[tkr].dropna()
+                    self._store_price((source, tkr), (series, fetch_start, fetch_end))
+                    if self.price_inflight.get((source, tkr)) is own[tkr]:
+                        del self.price_inflight[(source, tkr)]
+                    own[tkr][2].set_result(series)
+
+    def calendar(self, cfg, tickers, start_date, end_date):
+        source = source_key(cfg)
+        ttl = pd.Timedelta(days=cfg.get("earnings_ttl_days", 7)).total_seconds()
+        now = time.time()
+        found = {}
+        waits = {}
+        own = {}
+        with self.lock:
+            for tkr in tickers:
+                key = (source, tkr)
+                entry = self.earnings_cache.get(key)
+                if entry is not None and now - entry[1] <= ttl:
+                    self.earnings_cache.move_to_end(key)
+                    found[tkr] = entry[0]
+                    self.counters["earnings_hits"] += 1
+                elif key in self.earnings_inflight:
+                    waits[tkr] = self.earnings_inflight[key]
+                    self.counters["earnings_waits"] += 1
+                else:
+                    own[tkr] = Future()
+                    self.earnings_inflight[key] = own[tkr]
+
+        if own:
+            try:
+                # the full history is kept so any later date range is served from memory
+                fetched = backtest.earnings_for(cfg, list(own), pd.Timestamp.min, pd.Timestamp.max)
+            except Exception as exc:
+                fetched = None
+                error = exc
+            with self.lock:
+                if fetched is not None:
+                    self.counters["earnings_fetches"] += 1
+                for tkr, future in own.items():
+                    self.earnings_inflight.pop((source, tkr), None)
+                    if fetched is None:
+                        future.set_exception(error)
+                        continue
+                    self.earnings_cache[(source, tkr)] = (fetched[tkr], now)
+                    self.earnings_cache.move_to_end((source, tkr))
+                    future.set_result(fetched[tkr])
+                while len(self.earnings_cache) > self.max_earnings_tickers:
+                    self.earnings_cache.popitem(last=False)
+            for tkr, future in own.items():
+                found[tkr] = future.result()
+        for tkr, future in waits.items():
+            found[tkr] = future.result()
+
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        return {tkr: [d for d in found[tkr] if start <= d <= end] for tkr in tickers}
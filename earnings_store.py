@@ -0,0 +1,98 @@
+# earnings calendar store
+# announce dates are kept on disk with the time they were fetched and fetched again once older than the ttl
+# fetch is a provider earnings_dates function taking one ticker
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import pandas as pd
+try:
+    import fcntl
+except ImportError:
+    # no file locks on windows, sessions of one process are still serialized by the thread lock
+    fcntl = None
+
+STORE_COLUMNS = ["ticker", "earn_date", "fetched_at"]
+_thread_lock = threading.Lock()
+
+def store_path(cache_dir):
+    return os.path.join(cache_dir, "earnings.parquet")
+
+def read_store(cache_dir):
+    path = store_path(cache_dir) if cache_dir else None
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame(columns=STORE_COLUMNS)
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return pd.DataFrame(columns=STORE_COLUMNS)
+
+@contextmanager
+def store_lock(cache_dir):
+    # held around read, merge and write so concurrent sessions add to the store instead of replacing each other's rows
+    os.makedirs(cache_dir, exist_ok=True)
+    with _thread_lock, open(store_path(cache_dir) + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def merge_rows(store, fresh, fetched_at):
+    kept = store[~store["ticker"].isin(list(fresh))]
+    parts = [kept] if len(kept) else []
+    return pd.concat(parts + [store_rows(t, dates, fetched_at) for t, dates in fresh.items()], ignore_index=True)
+
+def write_store(cache_dir, store):
+    path = store_path(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    store.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def store_rows(ticker, dates, fetched_at):
+    # a ticker without events keeps one row with an empty date so it is not fetched again before the ttl
+    if not dates:
+        dates = [pd.NaT]
+    return pd.DataFrame({
+        "ticker": ticker,
+        "earn_date": pd.to_datetime(pd.Series(dates)).astype("datetime64[ns]"),
+        "fetched_at": fetched_at
+    })
+
+def fetch_many(tickers, fetch, max_workers):
+    def one(tkr):
+        try:
+            return tkr, fetch(tkr)
+        except Exception:
+            return tkr, None
+    if not tickers:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as pool:
+        return dict(pool.map(one, tickers))
+
+def earnings_calendar(tickers, start_date, end_date, fetch, cache_dir=None, ttl_days=7, max_workers=8):
+    now = pd.Timestamp.now().floor("s")
+    store = read_store(cache_dir)
+    fetched_at = store.groupby("ticker")["fetched_at"].max()
+    stale = [t for t in dict.fromkeys(tickers) if t not in fetched_at.index or now - fetched_at[t] > pd.Timedelta(days=ttl_days)]
+
+    # failed fetches keep whatever was stored before and are retried on the next call
+    fresh = {t: dates for t, dates in fetch_many(stale, fetch, max_workers).items() if dates is not None}
+    # the fetch runs unlocked, the store is read again under the lock so rows written meanwhile are kept
+    if fresh and cache_dir:
+        with store_lock(cache_dir):
+            store = merge_rows(read_store(cache_dir), fresh, now)
+            write_store(cache_dir, store)
+    elif fresh:
+        store = merge_rows(store, fresh, now)
+
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+    events = store[store["ticker"].isin(list(tickers)) & (store["earn_date"] >= start) & (store["earn_date"] <= end)]
+    calendar = {t: [] for t in tickers}
+    for tkr, dates in events.groupby("ticker")["earn_date"]:
+        calendar[tkr] = sorted(pd.to_datetime(dates).dt.to_pydatetime())
+    return calendar
@@ -0,0 +1,98 @@
+# parameter grid runner
+# prices are loaded once and placed in shared memory, worker processes map them without a copy
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import backtest
+from panel import PricePanel, open_panel
+
+# settings that only change event building and signal filtering, anything else needs another data load
+GRID_KEYS = ["three_month_signal_threshold", "entry_months", "exit_months", "min_price_history_days", "calendar_pad_days"]
+
+_worker = {}
+
+def grid_configs(grid):
+    unknown = [k for k in grid if k not in GRID_KEYS]
+    if unknown:
+        raise ValueError(f"grid keys must be in {GRID_KEYS}, got {unknown}")
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def share_array(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+    view[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def attach_array(handle):
+    name, shape, dtype = handle
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+def share_data(data):
+    # splits loaded market data into shared memory blocks plus the small parts sent to each worker once
+    panel = data["panel"]
+    returns = data["returns"] if data.get("returns") is not None else backtest.price_returns(panel.values)
+    blocks = []
+    handles = {}
+    # a panel mapped from a file is mapped again by each worker instead of copied into shared memory
+    arrays = [("returns", returns)] if panel.source is not None else [("values", panel.values), ("returns", returns)]
+    for key, arr in arrays:
+        shm, handles[key] = share_array(np.ascontiguousarray(arr))
+        blocks.append(shm)
+    meta = {k: v for k, v in data.items() if k not in ("panel", "returns")}
+    meta["panel"] = {"dates": panel.dates, "tickers": panel.tickers, "first": panel.first, "last": panel.last,
+                     "source": panel.source}
+    return blocks, handles, meta
+
+def attach_data(handles, meta):
+    blocks = []
+    arrays = {}
+    for key, handle in handles.items():
+        shm, arrays[key] = attach_array(handle)
+        blocks.append(shm)
+    data = {k: v for k, v in meta.items() if k != "panel"}
+    source = meta["panel"]["source"]
+    if source is not None:
+        path, start, stop = source
+        arrays["values"] = open_panel(path).values[start:stop]
+    data["panel"] = PricePanel(arrays["values"], **meta["panel"])
+    data["returns"] = arrays["returns"]
+    return blocks, data
+
+def init_worker(handles, meta, base_cfg):
+    # the blocks are kept referenced so the mapping lives as long as the worker
+    _worker["blocks"], _worker["data"] = attach_data(handles, meta)
+    _worker["cfg"] = base_cfg
+
+def run_point(params):
+    cfg = {**_worker["cfg"], **params}
+    data = _worker["data"]
+    events = backtest.build_events(data, cfg)
+    trades = backtest.signal_trades(events, cfg)
+    stats, _, _ = backtest.evaluate(trades, data)
+    return {**params, **stats}
+
+def run_grid(cfg, grid, data=None, max_workers=None, chunksize=None):
+    points = grid_configs(grid)
+    if data is None:
+        # one load wide enough for every grid point, events are cut back per point
+        load_cfg = dict(cfg)
+        load_cfg["min_price_history_days"] = min(grid.get("min_price_history_days", [cfg["min_price_history_days"]]))
+        load_cfg["calendar_pad_days"] = min(grid.get("calendar_pad_days", [cfg.get("calendar_pad_days", 0)]))
+        data = backtest.load_market_data(load_cfg)
+
+    blocks, handles, meta = share_data(data)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(handles, meta, cfg)) as pool:
+            if chunksize is None:
+                chunksize = max(1, len(points) // (4 * (max_workers or os.cpu_count() or 1)))
+            rows = list(pool.map(run_point, points, chunksize=chunksize))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return pd.DataFrame(rows)
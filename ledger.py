@@ -0,0 +1,76 @@
+# incremental consumers of trade record batches from backtest.iter_trades
+# every consumer has add(batch) and result(), so a run never needs the whole ledger in memory
+import numpy as np
+import pandas as pd
+import backtest
+
+class TradeStats:
+    # trade count, win rate, mean and median return, only the returns are kept for the median
+    def __init__(self):
+        self.r_hold = []
+
+    def add(self, batch):
+        self.r_hold.append(batch["r_hold"].copy())
+
+    def result(self):
+        r_hold = np.concatenate(self.r_hold) if self.r_hold else np.zeros(0)
+        return backtest.trade_summary(r_hold)
+
+class EquityBuilder:
+    # open position sums over the trading calendar, built a batch at a time
+    def __init__(self, data):
+        self.data = data
+        n = len(data["panel"].dates)
+        self.total = np.zeros(n)
+        self.count = np.zeros(n, dtype=np.int64)
+
+    def add(self, batch):
+        if not len(batch):
+            return
+        dates = self.data["panel"].dates
+        entry = np.searchsorted(dates, batch["entry_date"])
+        exit_ = np.searchsorted(dates, batch["exit_date"])
+        total, count = backtest.open_sums(batch["col"].astype(np.int64), entry, exit_, self.data["panel"], self.data.get("returns"))
+        self.total += total
+        self.count += count
+
+    def result(self):
+        # equity and benchmark curves like backtest.equity_curves
+        daily_index = backtest.daily_index_of(self.data)
+        daily = pd.Series(np.where(self.count > 0, self.total / np.maximum(self.count, 1), np.nan), index=self.data["panel"].index)
+        equity = (1.0 + daily.reindex(daily_index).fillna(0.0)).cumprod()
+        return equity, backtest.benchmark_equity(self.data, daily_index)
+
+class CsvWriter:
+    # appends every batch to a csv file with the columns of the trades frame
+    def __init__(self, path, tickers):
+        self.path = path
+        self.tickers = tickers
+        self.rows = 0
+        pd.DataFrame(columns=backtest.TRADE_COLUMNS).to_csv(path, index=False)
+
+    def add(self, batch):
+        frame = backtest.records_frame(batch, self.tickers)
+        frame.to_csv(self.path, mode="a", header=False, index=False, date_format="%Y-%m-%d")
+        self.rows += len(frame)
+
+    def result(self):
+        return self.rows
+
+def consume(batches, *consumers):
+    for batch in batches:
+        for consumer in consumers:
+            consumer.add(batch)
+    return [consumer.result() for consumer in consumers]
+
+def stream_backtest(cfg, data=None, batch_size=65536, trades_csv=None):
+    # run_backtest without a trades frame, returns the stats and the equity curves
+    # trades_csv gets the trades when given
+    data = data if data is not None else backtest.load_market_data(cfg)
+    consumers = [TradeStats(), EquityBuilder(data)]
+    if trades_csv:
+        consumers.append(CsvWriter(trades_csv, data["panel"].tickers))
+    results = consume(backtest.iter_trades(data, cfg, batch_size), *consumers)
+    equity, bench_equity = results[1]
+    stats = {**results[0], **backtest.curve_summary(equity, bench_equity)}
+    return stats, equity, bench_equity
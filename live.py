@@ -0,0 +1,302 @@
+# incremental daily run of the strategy
+# the state keeps the last equity values, the open positions and the events waiting for their entry day
+# so a new trading day costs O(open positions + entries due) instead of a full backtest
+# python -m backtest live --config cfg.json --state live_state
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import backtest
+
+STATE_FILE = "state.json"
+CURVE_FILE = "equity.csv"
+# settings a state was built with, end_date moves forward with every update
+STATE_KEYS = ["tickers", "benchmark", "start_date", "three_month_signal_threshold", "entry_months", "exit_months",
+              "min_price_history_days", "data_provider", "data_dir", "synthetic_seed"]
+
+def state_key(cfg):
+    return backtest.config_key(cfg, STATE_KEYS)
+
+def day_str(ts):
+    return pd.Timestamp(ts).date().isoformat()
+
+def event_table(data, cfg):
+    # every resolved earnings event with its entry and exit targets and the price on the earnings day
+    resolved = backtest.resolve_events(data, cfg)
+    months = backtest.trade_horizons(cfg)
+    targets = [backtest.add_months(resolved["earn"], m).astype("datetime64[ns]") for m in months]
+    pos = backtest.horizon_positions(resolved, months)
+    values = resolved["values"]
+    cols = resolved["cols"]
+    return pd.DataFrame({
+        "ticker": np.asarray(resolved["tickers"], dtype=object)[cols],
+        "earn_date": resolved["earn"],
+        "entry_target": targets[0],
+        "exit_target": targets[1],
+        "earn_price": values[resolved["earn_pos"], cols].astype(float),
+        "entry_pos": pos[:, 0],
+        "exit_pos": pos[:, 1]
+    })
+
+def pending_rows(table):
+    # pending entries are kept sorted by entry target so the ones due are always at the front
+    table = table.sort_values(["entry_target", "ticker"], kind="stable")
+    return [{"ticker": r.ticker, "earn_date": day_str(r.earn_date), "entry_target": day_str(r.entry_target),
+             "exit_target": day_str(r.exit_target), "earn_price": float(r.earn_price)} for r in table.itertuples()]
+
+def init_state(cfg, data=None):
+    # full run up to the last trading day of the data, events whose entry target is later become pending
+    data = data if data is not None else backtest.load_market_data(cfg)
+    panel = data["panel"]
+    daily_index = backtest.daily_index_of(data)
+    if len(daily_index) == 0:
+        raise ValueError("no trading days between start_date and end_date")
+    last_date = daily_index[-1]
+    last = int(np.searchsorted(panel.dates, last_date.to_datetime64()))
+
+    # entries and exits up to the last day only depend on rows up to it, later exits are still open
+    table = event_table(data, cfg)
+    entered = table[table["entry_target"] <= last_date.to_datetime64()].copy()
+    entered["exit_pos"] = np.where(entered["exit_target"] <= last_date.to_datetime64(), entered["exit_pos"], len(panel.dates) - 1)
+    values = panel.values
+    cols = panel.positions(entered["ticker"])
+    entry_price = values[entered["entry_pos"].to_numpy(), cols].astype(float)
+    entered["r_3m"] = entry_price / entered["earn_price"].to_numpy() - 1.0
+    entered["entry_price"] = entry_price
+    entered = entered[(entered["r_3m"] >= cfg["three_month_signal_threshold"]) & (entered["entry_pos"] < entered["exit_pos"])]
+    trades = pd.DataFrame({
+        "ticker": entered["ticker"].to_numpy(),
+        "entry_date": panel.dates[entered["entry_pos"].to_numpy()],
+        "exit_date": panel.dates[entered["exit_pos"].to_numpy()]
+    })
+
+    equity, bench_equity = backtest.equity_curves(trades, data)
+    total, count = backtest.position_sums(trades, panel, data.get("returns")) if len(trades) else (np.zeros(last + 1), np.zeros(last + 1))
+    # the exit row of an open position is the last panel row, which is the last day itself when the data ends there
+    still_open = entered[entered["exit_target"] > last_date.to_datetime64()]
+    bench = panel.series(data["benchmark"]).iloc[:last + 1].dropna()
+    state = {
+        "key": state_key(cfg),
+        "benchmark": data["benchmark"],
+        "last_date": day_str(last_date),
+        "equity": float(equity.iloc[-1]),
+        "prev_equity": float(equity.iloc[-2]) if len(equity) > 1 else 1.0,
+        "last_total": float(total[last]),
+        "last_count": int(count[last]),
+        "bench_equity": float(bench_equity.iloc[-1]),
+        "bench_price": float(bench.iloc[-1]) if len(bench) else np.nan,
+        "open": [{"ticker": r.ticker, "earn_date": day_str(r.earn_date), "entry_date": day_str(panel.dates[r.entry_pos]),
+                  "exit_target": day_str(r.exit_target), "r_3m": float(r.r_3m), "entry_price": float(r.entry_price),
+                  "last_price": float(values[last, panel.columns[r.ticker]])} for r in still_open.itertuples()],
+        "pending": pending_rows(table[table["entry_target"] > last_date.to_datetime64()])
+    }
+    curve = pd.DataFrame({"equity": equity, "bench_equity": bench_equity})
+    curve.index.name = "date"
+    return state, curve
+
+def add_pending(state, data, cfg):
+    # events that showed up in the calendar since the last update and are not yet due
+    known = {(p["ticker"], p["earn_date"]) for p in state["pending"] + state["open"]}
+    table = event_table(data, cfg)
+    table = table[table["entry_target"] > pd.Timestamp(state["last_date"]).to_datetime64()]
+    fresh = [row for row in pending_rows(table) if (row["ticker"], row["earn_date"]) not in known]
+    if fresh:
+        state["pending"] = sorted(state["pending"] + fresh, key=lambda p: (p["entry_target"], p["ticker"]))
+    return len(fresh)
+
+def nearer_day(target, prev_day, day):
+    # nearest of the previous and the current trading day, ties go to the later day like the backtest
+    return prev_day if target - prev_day < day - target else day
+
+def apply_day(state, day, price, prev_price, threshold):
+    # moves the state to the next trading day, price and prev_price give the close of a ticker on day and on the last day
+    # an entry or exit target between two trading days may turn out nearer the last day, entries found that way
+    # are added to the last day, which changes its average, so its equity is revised
+    prev_day = pd.Timestamp(state["last_date"])
+    day = pd.Timestamp(day)
+    revised = False
+    # pending is sorted by entry target and iso dates sort like the dates themselves
+    n_due = 0
+    while n_due < len(state["pending"]) and state["pending"][n_due]["entry_target"] <= day_str(day):
+        n_due += 1
+    due = state["pending"][:n_due]
+    del state["pending"][:n_due]
+    for p in due:
+        entry_day = nearer_day(pd.Timestamp(p["entry_target"]), prev_day, day)
+        entry_price = prev_price(p["ticker"]) if entry_day == prev_day else price(p["ticker"])
+        r_3m = entry_price / p["earn_price"] - 1.0
+        if not r_3m >= threshold:
+            continue
+        state["open"].append({"ticker": p["ticker"], "earn_date": p["earn_date"], "entry_date": day_str(entry_day),
+                              "exit_target": p["exit_target"], "r_3m": r_3m, "entry_price": entry_price, "last_price": entry_price})
+        if entry_day == prev_day:
+            state["last_count"] += 1
+            revised = True
+    if revised:
+        state["equity"] = state["prev_equity"] * (1.0 + state["last_total"] / state["last_count"])
+
+    total = 0.0
+    count = 0
+    still_open = []
+    for pos in state["open"]:
+        exit_day = nearer_day(pd.Timestamp(pos["exit_target"]), prev_day, day) if pd.Timestamp(pos["exit_target"]) <= day else None
+        if exit_day == prev_day:
+            continue
+        now = price(pos["ticker"])
+        if pos["entry_date"] != day_str(day):
+            r = now / pos["last_price"] - 1.0
+            total += r if np.isfinite(r) else 0.0
+        count += 1
+        pos["last_price"] = now
+        if exit_day is None:
+            still_open.append(pos)
+    state["open"] = still_open
+
+    daily = total / count if count else 0.0
+    state["prev_equity"] = state["equity"]
+    state["equity"] = state["equity"] * (1.0 + daily)
+    state["last_total"] = total
+    state["last_count"] = count
+    bench_now = price(state["benchmark"])
+    bench_ret = bench_now / state["bench_price"] - 1.0
+    state["bench_equity"] = state["bench_equity"] * (1.0 + (bench_ret if np.isfinite(bench_ret) else 0.0))
+    if np.isfinite(bench_now):
+        state["bench_price"] = bench_now
+    state["last_date"] = day_str(day)
+    return revised
+
+def row_prices(panel, row):
+    values = panel.values
+    columns = panel.columns
+    return lambda tkr: float(values[row, columns[tkr]])
+
+def advance(state, cfg, data):
+    # applies every trading day of data after the state's last day
+    # returns the new curve rows, a revised last day comes again with its new equity
+    panel = data["panel"]
+    add_pending(state, data, cfg)
+    start = int(np.searchsorted(panel.dates, pd.Timestamp(state["last_date"]).to_datetime64(), side="right"))
+    stop = int(np.searchsorted(panel.dates, data["end_date"].to_datetime64(), side="right"))
+    rows = []
+    for row in range(start, stop):
+        prev = {"date": pd.Timestamp(state["last_date"]), "bench_equity": state["bench_equity"]}
+        if apply_day(state, panel.dates[row], row_prices(panel, row), row_prices(panel, row - 1), cfg["three_month_signal_threshold"]):
+            rows.append(dict(prev, equity=state["prev_equity"]))
+        rows.append({"date": pd.Timestamp(panel.dates[row]), "equity": state["equity"], "bench_equity": state["bench_equity"]})
+    return pd.DataFrame(rows, columns=["date", "equity", "bench_equity"])
+
+def save_state(state_dir, state, rows):
+    # the curve file is only appended to, a revised day is written again and the last row of a date wins
+    os.makedirs(state_dir, exist_ok=True)
+    curve_path = os.path.join(state_dir, CURVE_FILE)
+    if len(rows):
+        rows.to_csv(curve_path, mode="a", header=not os.path.exists(curve_path), index=False, date_format="%Y-%m-%d")
+    path = os.path.join(state_dir, STATE_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def load_state(state_dir):
+    path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def read_curve(state_dir):
+    curve = pd.read_csv(os.path.join(state_dir, CURVE_FILE), parse_dates=["date"])
+    return curve.drop_duplicates("date", keep="last").set_index("date")
+
+def update(state_dir, cfg, data=None):
+    # first call runs the backtest up to end_date and stores its state, later calls only apply the new days
+    # today's bar may still be moving, an applied day is never applied again, so updates stop at yesterday
+    data = data if data is not None else backtest.load_market_data(cfg)
+    today = pd.Timestamp.today().normalize()
+    if data["end_date"] >= today:
+        data = truncated(data, today - pd.Timedelta(days=1))
+    state = load_state(state_dir)
+    if state is None:
+        state, curve = init_state(cfg, data)
+        rows = curve.reset_index()
+    else:
+        if state["key"] != state_key(cfg):
+            raise ValueError(f"state in {state_dir} was built with another config, start a new state directory")
+        rows = advance(state, cfg, data)
+    save_state(state_dir, state, rows)
+    return state, rows
+
+def truncated(data, end):
+    # data as a load on the day end sees it, the panel stops at the last trading day up to end
+    panel = data["panel"]
+    end = pd.Timestamp(end)
+    return dict(data, end_date=end, panel=panel.rows(panel.dates[0], end + pd.Timedelta(days=1)))
+
+def check(cfg, since, data=None):
+    # replays every trading day after since through update in a scratch state and compares the curve with run_backtest
+    # returns the number of replayed days and the largest equity and benchmark differences
+    # the last day is left out, it is provisional until the next update
+    data = data if data is not None else backtest.load_market_data(cfg)
+    days = backtest.daily_index_of(data)
+    since = pd.Timestamp(since)
+    with tempfile.TemporaryDirectory() as state_dir:
+        update(state_dir, cfg, truncated(data, since))
+        for day in days[days > since]:
+            update(state_dir, cfg, truncated(data, day))
+        curve = read_curve(state_dir)
+    _, _, equity, bench_equity = backtest.run_backtest(cfg, data)
+    dates = equity.index[:-1]
+    return {
+        "days": int((days > since).sum()),
+        "equity": float(np.abs(curve["equity"].reindex(dates) - equity.loc[dates]).max(skipna=False)),
+        "bench_equity": float(np.abs(curve["bench_equity"].reindex(dates) - bench_equity.loc[dates]).max(skipna=False))
+    }
+
+def scan(cfg, data=None, days=10):
+    # morning scan as of the last trading day of the data
+    # upcoming: events whose entry target falls in the next days calendar days with their running r_3m
+    # open: positions taken by the signal and not exited yet with their exit targets
+    data = data if data is not None else backtest.load_market_data(cfg)
+    panel = data["panel"]
+    daily_index = backtest.daily_index_of(data)
+    if len(daily_index) == 0:
+        raise ValueError("no trading days between start_date and end_date")
+    as_of = daily_index[-1].to_datetime64()
+    last = int(np.searchsorted(panel.dates, as_of))
+    threshold = cfg["three_month_signal_threshold"]
+    table = event_table(data, cfg)
+    cols = panel.positions(table["ticker"])
+    last_price = panel.values[last, cols].astype(float)
+    earn_price = table["earn_price"].to_numpy()
+    entry_target = table["entry_target"].to_numpy()
+    exit_target = table["exit_target"].to_numpy()
+
+    soon = (entry_target > as_of) & (entry_target <= as_of + np.timedelta64(int(days), "D"))
+    running = last_price[soon] / earn_price[soon] - 1.0
+    upcoming = pd.DataFrame({
+        "ticker": table["ticker"].to_numpy()[soon],
+        "earn_date": table["earn_date"].to_numpy()[soon],
+        "entry_target": entry_target[soon],
+        "days_to_entry": (entry_target[soon] - as_of) // np.timedelta64(1, "D"),
+        "r_3m": running,
+        "passes": running >= threshold
+    }).sort_values(["entry_target", "ticker"], kind="stable").reset_index(drop=True)
+
+    entered = (entry_target <= as_of) & (exit_target > as_of)
+    entry_pos = table["entry_pos"].to_numpy()[entered]
+    entry_price = panel.values[entry_pos, cols[entered]].astype(float)
+    r_3m = entry_price / earn_price[entered] - 1.0
+    held = pd.DataFrame({
+        "ticker": table["ticker"].to_numpy()[entered],
+        "earn_date": table["earn_date"].to_numpy()[entered],
+        "entry_date": panel.dates[entry_pos],
+        "exit_target": exit_target[entered],
+        "days_to_exit": (exit_target[entered] - as_of) // np.timedelta64(1, "D"),
+        "r_3m": r_3m,
+        "entry_price": entry_price,
+        "last_price": last_price[entered],
+        "r_open": last_price[entered] / entry_price - 1.0
+    })
+    held = held[held["r_3m"] >= threshold].sort_values(["exit_target", "ticker"], kind="stable").reset_index(drop=True)
+    return upcoming, held
@@ -0,0 +1,124 @@
+# compact price panel
+# one contiguous (dates x tickers) matrix with a shared date index and the valid row span of every ticker
+# a panel can be saved as a directory of .npy files and opened memory mapped, read only and without a copy
+import json
+import os
+import numpy as np
+import pandas as pd
+
+PANEL_FILES = ["values.npy", "dates.npy", "spans.npy", "tickers.json"]
+
+class PricePanel:
+    def __init__(self, values, dates, tickers, first=None, last=None, source=None):
+        self.values = values
+        # (path, row start, row stop) when the values are mapped from a panel file
+        self.source = source
+        self.dates = np.asarray(dates, dtype="datetime64[ns]")
+        self.tickers = list(tickers)
+        self.columns = {t: i for i, t in enumerate(self.tickers)}
+        if first is None or last is None:
+            first, last = valid_rows(values)
+        self.first = np.asarray(first, dtype=np.int64)
+        self.last = np.asarray(last, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, prices, dtype="float64"):
+        values = np.ascontiguousarray(prices.to_numpy(dtype=dtype))
+        return cls(values, prices.index.values, prices.columns)
+
+    @property
+    def index(self):
+        return pd.DatetimeIndex(self.dates)
+
+    def positions(self, tickers):
+        return np.array([self.columns[t] for t in tickers], dtype=np.int64)
+
+    def series(self, ticker):
+        return pd.Series(self.values[:, self.columns[ticker]], index=self.index, name=ticker, dtype=float)
+
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=self.index, columns=self.tickers, copy=False)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.dates.nbytes
+
+    def rows(self, start, stop):
+        # view of the rows between two dates, start included and stop excluded
+        # prices are forward filled, so every column stays valid from its first row to its last
+        a, b = np.searchsorted(self.dates, np.array([start, stop], dtype="datetime64[ns]"))
+        a, b = int(a), int(b)
+        has = (self.first >= 0) & (self.first < b) & (self.last >= a)
+        first = np.where(has, np.maximum(self.first, a) - a, -1)
+        last = np.where(has, np.minimum(self.last, b - 1) - a, -1)
+        source = None
+        if self.source is not None:
+            source = (self.source[0], self.source[1] + a, self.source[1] + b)
+        return PricePanel(self.values[a:b], self.dates[a:b], self.tickers, first, last, source)
+
+def valid_rows(values):
+    # first and last non missing row of every column, -1 when a column has no prices
+    valid = ~np.isnan(values)
+    if len(valid) == 0:
+        return np.full(valid.shape[1], -1), np.full(valid.shape[1], -1)
+    has = valid.any(axis=0)
+    first = np.where(has, valid.argmax(axis=0), -1)
+    last = np.where(has, len(valid) - 1 - valid[::-1].argmax(axis=0), -1)
+    return first, last
+
+def ffill_rows(values, chunk=256):
+    # forward fill down every column in place, a block of columns at a time so the row index matrix stays small
+    rows = np.arange(len(values))[:, None]
+    for c0 in range(0, values.shape[1], chunk):
+        block = values[:, c0:c0 + chunk]
+        idx = np.where(np.isnan(block), 0, rows)
+        np.maximum.accumulate(idx, axis=0, out=idx)
+        block[:] = np.take_along_axis(block, idx, axis=0)
+    return values
+
+def stack_frames(frames, tickers, dtype="float64"):
+    # price frames holding some of the tickers each, stacked into one forward filled panel over the union of their dates
+    # only the panel and the frame being added are held at a time, the same result as one frame of every ticker
+    columns = {t: i for i, t in enumerate(tickers)}
+    dates = np.zeros(0, dtype="datetime64[ns]")
+    values = np.full((0, len(tickers)), np.nan, dtype=dtype)
+    for frame in frames:
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame()
+        if len(frame.index) == 0:
+            continue
+        frame = frame[[c for c in frame.columns if c in columns]]
+        index = pd.DatetimeIndex(frame.index).values.astype("datetime64[ns]")
+        merged = np.union1d(dates, index)
+        if len(merged) != len(dates):
+            grown = np.full((len(merged), len(tickers)), np.nan, dtype=dtype)
+            grown[np.searchsorted(merged, dates)] = values
+            dates, values = merged, grown
+        cols = np.array([columns[c] for c in frame.columns], dtype=np.int64)
+        if len(cols):
+            values[np.searchsorted(dates, index)[:, None], cols] = frame.to_numpy(dtype=dtype)
+    return PricePanel(ffill_rows(values), dates, tickers)
+
+def replace_file(path, write):
+    # write then rename so readers never see a half written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+def save_panel(panel, path):
+    os.makedirs(path, exist_ok=True)
+    replace_file(os.path.join(path, "values.npy"), lambda f: np.save(f, np.ascontiguousarray(panel.values)))
+    replace_file(os.path.join(path, "dates.npy"), lambda f: np.save(f, panel.dates))
+    replace_file(os.path.join(path, "spans.npy"), lambda f: np.save(f, np.stack([panel.first, panel.last])))
+    # each file is replaced whole but not the set of them, rewrite a panel while no run has it open
+    replace_file(os.path.join(path, "tickers.json"), lambda f: f.write(json.dumps(panel.tickers).encode()))
+
+def open_panel(path):
+    # the values are mapped read only, pages are shared through the page cache by every process opening the file
+    values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+    dates = np.load(os.path.join(path, "dates.npy"))
+    first, last = np.load(os.path.join(path, "spans.npy"))
+    with open(os.path.join(path, "tickers.json")) as f:
+        tickers = json.load(f)
+    return PricePanel(values, dates, tickers, first, last, (path, 0, len(dates)))
@@ -0,0 +1,204 @@
+# on disk price store
+# one parquet file per ticker keyed by date, only missing date spans are fetched
+# fetch is a provider prices function taking (tickers, start, end)
+import json
+import os
+import threading
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from panel import PricePanel, save_panel
+
+COVERAGE_KEY = b"coverage"
+
+def ticker_path(cache_dir, ticker):
+    return os.path.join(cache_dir, "prices", f"{ticker}.parquet")
+
+def read_ticker(cache_dir, ticker):
+    # returns the cached close series and the [start, end) span it covers
+    path = ticker_path(cache_dir, ticker)
+    if not os.path.exists(path):
+        return None, None
+    try:
+        table = pq.read_table(path)
+    except Exception:
+        return None, None
+    meta = json.loads(table.schema.metadata[COVERAGE_KEY])
+    df = table.to_pandas()
+    series = pd.Series(df["close"].to_numpy(), index=pd.DatetimeIndex(df["date"]), name=ticker)
+    return series, (pd.Timestamp(meta["start"]), pd.Timestamp(meta["end"]))
+
+def write_ticker(cache_dir, ticker, series, coverage):
+    path = ticker_path(cache_dir, ticker)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = pd.DataFrame({"date": series.index.astype("datetime64[ns]"), "close": series.to_numpy(dtype=float)})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[COVERAGE_KEY] = json.dumps({"start": coverage[0].isoformat(), "end": coverage[1].isoformat()}).encode()
+    table = table.replace_schema_metadata(meta)
+    # write then rename so readers never see a half written file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+def missing_spans(coverage, start, end):
+    # spans before the cached range, the tail after it is handled by refresh
+    if coverage is None:
+        return [(start, end)]
+    if start < coverage[0]:
+        return [(start, coverage[0])]
+    return []
+
+def naive_index(index):
+    index = pd.DatetimeIndex(index)
+    return index.tz_localize(None) if index.tz is not None else index
+
+def merge_series(old, new):
+    if old is None or old.empty:
+        return new.sort_index()
+    merged = pd.concat([old, new])
+    return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+def column(frame, tkr):
+    new = frame[tkr].dropna() if tkr in frame.columns else pd.Series(dtype=float)
+    new.index = naive_index(new.index)
+    return new.astype(float).rename(tkr)
+
+def fetched_nothing(frame):
+    # nothing came back for the whole batch, treat as a failed fetch and retry next time
+    return frame is None or frame.dropna(how="all").empty
+
+def tail_matches(series, coverage, fresh, since, rtol):
+    # bars on or after the coverage end are provisional and are not compared
+    old = series[(series.index >= since) & (series.index < coverage[1])]
+    common = old.index.intersection(fresh.index)
+    if common.empty:
+        return True
+    return bool(np.allclose(old.loc[common].to_numpy(), fresh.loc[common].to_numpy(), rtol=rtol, atol=0.0))
+
+def refresh_cached(cached, tickers, cache_dir, end, fetch, overlap_bars, rtol):
+    today = pd.Timestamp.today().normalize()
+    rows = []
+    groups = defaultdict(list)
+    for tkr in tickers:
+        series, coverage = cached[tkr]
+        if coverage is None or coverage[1] >= end:
+            continue
+        if series is None or series.empty:
+            since = coverage[1]
+        else:
+            # re-pull the last few stored bars so restated history shows up as a mismatch
+            since = series.index[-min(overlap_bars, len(series))]
+        groups[since].append(tkr)
+
+    restated = defaultdict(list)
+    for since, group in groups.items():
+        frame = fetch(group, since, end)
+        if fetched_nothing(frame):
+            continue
+        for tkr in group:
+            series, coverage = cached[tkr]
+            fresh = column(frame, tkr)
+            # the overlap bars always come back for a live ticker, nothing at all is a failed fetch
+            # and the coverage stays put so the span is asked for again next time
+            if fresh.empty:
+                continue
+            last_bar = series.index.max() if series is not None and not series.empty else pd.NaT
+            if series is not None and not tail_matches(series, coverage, fresh, since, rtol):
+                restated[coverage[0]].append(tkr)
+                continue
+            new_bars = len(fresh) if pd.isna(last_bar) else int((fresh.index > last_bar).sum())
+            changed = fresh[fresh.index >= coverage[1]]
+            new_coverage = (coverage[0], max(coverage[1], min(end, today)))
+            # only tickers that got new or provisional bars are rewritten
+            if not changed.empty or new_coverage != coverage:
+                series = merge_series(series, changed)
+                write_ticker(cache_dir, tkr, series, new_coverage)
+                cached[tkr] = (series, new_coverage)
+            rows.append({"ticker": tkr, "last_bar": last_bar, "new_bars": new_bars, "restated": False})
+
+    # adjusted history changed, so the whole span of those tickers is downloaded again
+    for cov_start, group in restated.items():
+        frame = fetch(group, cov_start, end)
+        if fetched_nothing(frame):
+            continue
+        for tkr in group:
+            series, coverage = cached[tkr]
+            fresh = column(frame, tkr)
+            if fresh.empty:
+                continue
+            last_bar = series.index.max()
+            coverage = (cov_start, max(coverage[1], min(end, today)))
+            write_ticker(cache_dir, tkr, fresh, coverage)
+            cached[tkr] = (fresh, coverage)
+            rows.append({"ticker": tkr, "last_bar": last_bar, "new_bars": int((fresh.index > last_bar).sum()), "restated": True})
+
+    return pd.DataFrame(rows, columns=["ticker", "last_bar", "new_bars", "restated"])
+
+def refresh_prices(tickers, cache_dir, fetch, end=None, overlap_bars=5, rtol=1e-6):
+    # append bars newer than the last cached one for every cached ticker
+    end = pd.Timestamp.today().normalize() + pd.Timedelta(days=1) if end is None else pd.Timestamp(end)
+    cached = {tkr: read_ticker(cache_dir, tkr) for tkr in tickers}
+    return refresh_cached(cached, tickers, cache_dir, end, fetch, overlap_bars, rtol)
+
+def load_prices(tickers, start, end, cache_dir, fetch, overlap_bars=5, rtol=1e-6):
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    # the bar of the current day may still change, so coverage never reaches past today
+    today = pd.Timestamp.today().normalize()
+
+    cached = {}
+    needs = defaultdict(list)
+    for tkr in tickers:
+        series, coverage = read_ticker(cache_dir, tkr)
+        cached[tkr] = (series, coverage)
+        for span in missing_spans(coverage, start, end):
+            if series is not None and not series.empty:
+                # the span reaches the first stored bar, so a fetch that worked always returns at least that bar
+                span = (span[0], max(span[1], series.index[0] + pd.Timedelta(days=1)))
+            needs[span].append(tkr)
+
+    # tickers missing the same span are fetched together in one call
+    for (span_start, span_end), group in needs.items():
+        frame = fetch(group, span_start, span_end)
+        if fetched_nothing(frame):
+            continue
+        for tkr in group:
+            new = column(frame, tkr)
+            series, coverage = cached[tkr]
+            # an empty column is a failed ticker when it was never stored or its first stored bar did not come back,
+            # it keeps its coverage and the span is fetched again next time
+            # a stored ticker without bars in a batch that returned data simply had none, like a span before its listing
+            if new.empty and (coverage is None or not series.empty):
+                continue
+            series = merge_series(series, new)
+            if coverage is None:
+                coverage = (span_start, min(span_end, today))
+            else:
+                coverage = (span_start, coverage[1])
+            write_ticker(cache_dir, tkr, series, coverage)
+            cached[tkr] = (series, coverage)
+
+    refresh_cached(cached, tickers, cache_dir, end, fetch, overlap_bars, rtol)
+
+    cols = {}
+    for tkr in tickers:
+        series = cached[tkr][0]
+        if series is None:
+            series = pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+        cols[tkr] = series[(series.index >= start) & (series.index < end)]
+    return pd.DataFrame(cols)
+
+def write_panel(tickers, cache_dir, path, dtype="float64"):
+    # every cached bar of the tickers as one memory mappable panel, see panel.open_panel
+    # prices are forward filled the same way the engine fills downloaded prices
+    cols = {}
+    for tkr in tickers:
+        series, _ = read_ticker(cache_dir, tkr)
+        cols[tkr] = series if series is not None else pd.Series(dtype=float)
+    frame = pd.DataFrame(cols).reindex(columns=list(tickers)).sort_index().ffill()
+    panel = PricePanel.from_frame(frame, dtype)
+    save_panel(panel, path)
+    return panel
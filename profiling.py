@@ -0,0 +1,62 @@
+# per stage wall time, call counts and peak traced memory for a backtest run
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+
+class Profile:
+    def __init__(self, memory=True):
+        self.memory = memory
+        # stage name -> [calls, seconds, peak bytes]
+        self.stages = {}
+        self._stack = []
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        # nested stages are recorded under parent/child names
+        full = "/".join([s[0] for s in self._stack] + [name])
+        tracing = self.memory and self._start_tracing()
+        if tracing:
+            if self._stack:
+                # keep the parent's peak so far before the child resets it
+                self._stack[-1][2] = max(self._stack[-1][2], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        frame = [name, time.perf_counter(), 0]
+        self._stack.append(frame)
+        try:
+            yield self
+        finally:
+            self._stack.pop()
+            seconds = time.perf_counter() - frame[1]
+            peak = 0
+            if tracing:
+                peak = max(frame[2], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1][2] = max(self._stack[-1][2], peak)
+                tracemalloc.reset_peak()
+            entry = self.stages.setdefault(full, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], peak)
+            if not self._stack:
+                self._stop_tracing()
+
+    def _start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return True
+
+    def _stop_tracing(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def frame(self):
+        rows = [{"stage": name, "calls": calls, "seconds": seconds, "peak_mb": peak / 1024 ** 2}
+                for name, (calls, seconds, peak) in self.stages.items()]
+        return pd.DataFrame(rows, columns=["stage", "calls", "seconds", "peak_mb"])
+
+def stage(profile, name):
+    return profile.stage(name) if profile is not None else nullcontext()
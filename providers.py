@@ -0,0 +1,118 @@
+# market data providers
+# every provider returns close prices as a frame with one column per ticker and earnings announce dates per ticker
+import os
+import zlib
+import numpy as np
+import pandas as pd
+
+class YFinanceProvider:
+    name = "yfinance"
+    # remote data goes through the on disk stores
+    cacheable = True
+
+    def prices(self, tickers, start, end):
+        # yfinance is imported on first use so offline runs never load it
+        import yfinance as yf
+        data = yf.download(list(tickers), start=start, end=end, auto_adjust=True, progress=False)["Close"]
+        if isinstance(data, pd.Series):
+            data = data.to_frame(name=tickers[0])
+        return data
+
+    def earnings_dates(self, ticker):
+        import yfinance as yf
+        df = yf.Ticker(ticker).get_earnings_dates(limit=100)
+        if df is None or df.empty:
+            return []
+        return list(df.index.tz_localize(None))
+
+class LocalProvider:
+    # reads <data_dir>/prices/<ticker>.parquet or .csv with date and close columns
+    # and <data_dir>/earnings.parquet or earnings.csv with ticker and earn_date columns
+    # a price_cache directory written by the stores has the same layout
+    name = "local"
+    cacheable = False
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._earnings = None
+
+    def _find(self, *parts):
+        base = os.path.join(self.data_dir, *parts)
+        for ext in (".parquet", ".csv"):
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def _read(self, path):
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+
+    def prices(self, tickers, start, end):
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        cols = {}
+        for tkr in tickers:
+            path = self._find("prices", tkr)
+            if path is None:
+                continue
+            df = self._read(path)
+            s = pd.Series(df["close"].to_numpy(dtype=float), index=pd.DatetimeIndex(pd.to_datetime(df["date"])), name=tkr)
+            cols[tkr] = s[(s.index >= start) & (s.index < end)]
+        return pd.DataFrame(cols)
+
+    def earnings_dates(self, ticker):
+        if self._earnings is None:
+            path = self._find("earnings")
+            if path is None:
+                self._earnings = {}
+            else:
+                df = self._read(path).dropna(subset=["earn_date"])
+                dates = pd.to_datetime(df["earn_date"])
+                self._earnings = {t: list(d) for t, d in dates.groupby(df["ticker"])}
+        return self._earnings.get(ticker, [])
+
+class SyntheticProvider:
+    # deterministic random walks and quarterly earnings, the same ticker and seed always give the same data
+    name = "synthetic"
+    cacheable = False
+
+    def __init__(self, seed=0, first_date="1990-01-01", last_date="2035-12-31"):
+        self.seed = int(seed)
+        self.dates = pd.bdate_range(first_date, last_date)
+
+    def _rng(self, ticker, stream):
+        return np.random.default_rng([self.seed, zlib.crc32(ticker.encode()), stream])
+
+    def series(self, ticker):
+        rng = self._rng(ticker, 0)
+        mu = rng.normal(0.0003, 0.0003)
+        sigma = rng.uniform(0.01, 0.03)
+        values = 100.0 * np.exp(np.cumsum(rng.normal(mu, sigma, len(self.dates))))
+        # later listings so the history filter has something to do
+        listed = int(rng.integers(0, len(self.dates) // 4))
+        values[:listed] = np.nan
+        return pd.Series(values, index=self.dates, name=ticker)
+
+    def prices(self, tickers, start, end):
+        mask = (self.dates >= pd.Timestamp(start)) & (self.dates < pd.Timestamp(end))
+        return pd.DataFrame({tkr: self.series(tkr)[mask] for tkr in tickers})
+
+    def earnings_dates(self, ticker):
+        rng = self._rng(ticker, 1)
+        first = self.dates[0] + pd.Timedelta(days=int(rng.integers(20, 80)))
+        n = int((self.dates[-1] - first).days // 91) + 1
+        offsets = np.arange(n) * 91 + rng.integers(-5, 6, n)
+        return list(first + pd.to_timedelta(offsets, unit="D"))
+
+def get_provider(cfg):
+    name = cfg.get("data_provider", "yfinance")
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "local":
+        if not cfg.get("data_dir"):
+            raise ValueError("data_provider local needs data_dir")
+        return LocalProvider(cfg["data_dir"])
+    if name == "synthetic":
+        return SyntheticProvider(cfg.get("synthetic_seed", 0))
+    raise ValueError(f"unknown data_provider {name}")
@@ -0,0 +1,209 @@
+# bootstrap confidence intervals and a p value of the strategy against the all events baseline
+# resamples are drawn as index matrices and every metric is computed for a whole chunk of them at once
+import math
+import numpy as np
+import pandas as pd
+import backtest
+
+TRADE_METRICS = ["win_rate", "avg_trade_return", "median_trade_return"]
+DAILY_METRICS = ["equity_cagr", "sharpe", "max_drawdown"]
+
+def trade_metrics(r_sorted, picks):
+    # r_sorted is the ascending trade returns and picks a (resamples, trades) matrix of positions in it
+    # positions sort much faster than gathered floats and the median of the positions picks the median return
+    if picks.shape[1] == 0:
+        nan = np.full(len(picks), np.nan)
+        return {"win_rate": nan, "avg_trade_return": nan, "median_trade_return": nan}
+    n = picks.shape[1]
+    ordered = np.sort(picks, axis=1)
+    median = (r_sorted[ordered[:, (n - 1) // 2]] + r_sorted[ordered[:, n // 2]]) / 2.0
+    return {
+        "win_rate": (picks >= np.searchsorted(r_sorted, 0.0, side="right")).mean(axis=1),
+        "avg_trade_return": r_sorted[picks].mean(axis=1),
+        "median_trade_return": median
+    }
+
+def daily_metrics(returns, freq=252):
+    # returns is (resamples, days) of daily strategy returns, same formulas as backtest.summary_stats
+    # the first day only moves the curve off 1.0, the sharpe skips it like pct_change does in curve_summary
+    n = returns.shape[1]
+    if n < 2:
+        nan = np.full(len(returns), np.nan)
+        return {"equity_cagr": nan, "sharpe": nan, "max_drawdown": nan}
+    growth = np.cumprod(1.0 + returns, axis=1)
+    mu = returns[:, 1:].mean(axis=1) * freq
+    sig = returns[:, 1:].std(axis=1) * math.sqrt(freq)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.where(sig > 0, mu / sig, np.nan)
+    return {
+        "equity_cagr": growth[:, -1] ** (float(freq) / n) - 1.0,
+        "sharpe": sharpe,
+        "max_drawdown": (growth / np.maximum.accumulate(growth, axis=1) - 1.0).min(axis=1)
+    }
+
+def iid_indices(rng, n, size):
+    return rng.integers(0, max(n, 1), size=(size, n), dtype=np.int32)
+
+def block_indices(rng, n, size, block):
+    # moving block bootstrap, blocks of consecutive days from random starts wrap around the end of the sample
+    block = max(1, min(int(block), n))
+    blocks = -(-n // block)
+    starts = rng.integers(0, n, size=(size, blocks, 1), dtype=np.int32)
+    idx = (starts + np.arange(block, dtype=np.int32)) % n
+    return idx.reshape(size, blocks * block)[:, :n]
+
+def daily_returns(equity):
+    # daily returns that compound back to the equity curve, the first day is measured from 1.0
+    values = equity.to_numpy(dtype=float)
+    return np.diff(values, prepend=1.0) / np.concatenate([[1.0], values[:-1]])
+
+def chunk_sizes(n_resamples, width, max_cells):
+    # resamples per chunk so that one (resamples, width) matrix stays under max_cells
+    chunk = max(1, min(int(n_resamples), int(max_cells) // max(int(width), 1)))
+    full, rest = divmod(int(n_resamples), chunk)
+    return [chunk] * full + ([rest] if rest else [])
+
+def resample(strategy, baseline, n_resamples=10000, block_days=20, max_cells=4_000_000, seed=0):
+    # strategy and baseline are (sorted trade r_hold, daily returns) pairs
+    # trades are resampled on their own, daily returns of both share the same day blocks so their difference is paired
+    out = {side: {m: [] for m in TRADE_METRICS + DAILY_METRICS} for side in ("strategy", "baseline")}
+    n_days = len(strategy[1])
+    width = max(n_days, len(strategy[0]), len(baseline[0]))
+    for k, size in enumerate(chunk_sizes(n_resamples, width, max_cells)):
+        rng = np.random.default_rng([seed, k])
+        days = block_indices(rng, n_days, size, block_days) if n_days else np.zeros((size, 0), dtype=np.int64)
+        for side, (r_hold, rets) in (("strategy", strategy), ("baseline", baseline)):
+            picks = iid_indices(rng, len(r_hold), size) if len(r_hold) else np.zeros((size, 0), dtype=np.int64)
+            metrics = {**trade_metrics(r_hold, picks), **daily_metrics(rets[days])}
+            for m, values in metrics.items():
+                out[side][m].append(values)
+    return {side: {m: np.concatenate(v) for m, v in metrics.items()} for side, metrics in out.items()}
+
+def significance(cfg, data=None, events=None, n_resamples=10000, block_days=20, max_cells=4_000_000, seed=0, alpha=0.05):
+    # one row per metric with the strategy and baseline estimates from summary_stats, their percentile intervals
+    # and the one sided p value of the strategy being no better than the baseline
+    data = data if data is not None else backtest.load_market_data(cfg)
+    events = events if events is not None else backtest.build_events(data, cfg)
+    est, trades, equity, _ = backtest.run_backtest(cfg, data, events)
+    base_est, base_trades, base_equity, _ = backtest.run_backtest_baseline(cfg, data, events)
+    strategy = (np.sort(trades["r_hold"].to_numpy(dtype=float)), daily_returns(equity))
+    baseline = (np.sort(base_trades["r_hold"].to_numpy(dtype=float)), daily_returns(base_equity))
+    draws = resample(strategy, baseline, n_resamples, block_days, max_cells, seed)
+
+    q = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    rows = []
+    for m in TRADE_METRICS + DAILY_METRICS:
+        s, b = draws["strategy"][m], draws["baseline"][m]
+        diff = s - b
+        ok = ~np.isnan(diff)
+        s_lo, s_hi = np.nanpercentile(s, q) if (~np.isnan(s)).any() else (np.nan, np.nan)
+        b_lo, b_hi = np.nanpercentile(b, q) if (~np.isnan(b)).any() else (np.nan, np.nan)
+        rows.append({
+            "metric": m,
+            "strategy": est[m], "strategy_lo": s_lo, "strategy_hi": s_hi,
+            "baseline": base_est[m], "baseline_lo": b_lo, "baseline_hi": b_hi,
+            "diff": est[m] - base_est[m],
+            "p_value": (int((diff[ok] <= 0).sum()) + 1) / (int(ok.sum()) + 1) if ok.any() else np.nan
+        })
+    return pd.DataFrame(rows).set_index("metric")
+
+def batch_daily_returns(weights, cols, entry, exit_, returns, day_chunk=256):
+    # equal weight daily return of many event selections at once, weights is (selections, events)
+    # events must be sorted by entry row, cols index the columns of returns
+    # days are processed in chunks of day_chunk rows, only events open in a chunk are multiplied against the weights
+    k = len(weights)
+    n_days = len(returns)
+    total = np.zeros((k, n_days))
+    count = np.zeros((k, n_days))
+    if len(entry) == 0:
+        return total
+    max_hold = int((exit_ - entry).max())
+    for t0 in range(0, n_days, day_chunk):
+        t1 = min(t0 + day_chunk, n_days)
+        lo = np.searchsorted(entry, t0 - max_hold, side="left")
+        hi = np.searchsorted(entry, t1, side="left")
+        if lo == hi:
+            continue
+        days = np.arange(t0, t1)
+        e, x = entry[lo:hi, None], exit_[lo:hi, None]
+        held = (days >= e) & (days <= x)
+        # a position earns nothing on its entry day but counts toward the average
+        earning = np.where(held & (days > e), returns[t0:t1][:, cols[lo:hi]].T, 0.0)
+        w = weights[:, lo:hi]
+        total[:, t0:t1] = w @ earning
+        count[:, t0:t1] = w @ held.astype(float)
+    return np.where(count > 0, total / np.maximum(count, 1), 0.0)
+
+def random_selections(rng, n_events, n_selected, size):
+    # every row selects exactly n_selected events uniformly without replacement
+    if n_selected == 0:
+        return np.zeros((size, n_events))
+    keys = rng.random((size, n_events))
+    cut = np.partition(keys, n_selected - 1, axis=1)[:, n_selected - 1:n_selected]
+    return (keys <= cut).astype(float)
+
+def selection_trade_metrics(weights, r_hold, n_selected):
+    # trade metrics of 0/1 event selections, r_hold must be sorted ascending
+    if n_selected == 0:
+        nan = np.full(len(weights), np.nan)
+        return {"win_rate": nan, "avg_trade_return": nan, "median_trade_return": nan}
+    taken = np.cumsum(weights, axis=1)
+    lower = (taken > (n_selected - 1) // 2).argmax(axis=1)
+    upper = (taken > n_selected // 2).argmax(axis=1)
+    return {
+        "win_rate": weights @ (r_hold > 0) / n_selected,
+        "avg_trade_return": weights @ r_hold / n_selected,
+        "median_trade_return": (r_hold[lower] + r_hold[upper]) / 2.0
+    }
+
+def permutation_test(cfg, data=None, events=None, n_draws=1000, seed=0, day_chunk=256, max_cells=4_000_000):
+    # null distribution of the signal: as many events as the threshold keeps, drawn at random from all events
+    # one row per metric with the observed value, the null mean and 95% range and the share of draws doing at least as well
+    data = data if data is not None else backtest.load_market_data(cfg)
+    events = events if events is not None else backtest.build_events(data, cfg)
+    panel = data["panel"]
+    cols, entry, exit_ = backtest.trade_positions(events, panel)
+    r_hold = events["r_hold"].to_numpy(dtype=float)
+    chosen = (events["r_3m"] >= cfg["three_month_signal_threshold"]).to_numpy(dtype=float)
+
+    # events sorted by entry row for the day chunks and by return for the medians
+    order = np.argsort(entry, kind="stable")
+    cols, entry, exit_, chosen, r_hold = cols[order], entry[order], exit_[order], chosen[order], r_hold[order]
+    by_return = np.argsort(r_hold, kind="stable")
+    traded, local = np.unique(cols, return_inverse=True)
+    if data.get("returns") is not None:
+        returns = data["returns"][:, traded]
+    else:
+        returns = backtest.price_returns(panel.values[:, traded])
+    daily_index = backtest.daily_index_of(data)
+    start = np.searchsorted(panel.dates, daily_index.values[0]) if len(daily_index) else 0
+    window = slice(start, start + len(daily_index))
+
+    def metrics(weights):
+        daily = batch_daily_returns(weights, local, entry, exit_, returns, day_chunk)[:, window]
+        n_selected = int(weights[0].sum()) if len(weights) else 0
+        trades = selection_trade_metrics(weights[:, by_return], r_hold[by_return], n_selected)
+        return {**trades, **daily_metrics(daily)}
+
+    observed = metrics(chosen[None, :])
+    n_selected = int(chosen.sum())
+    null = {m: [] for m in TRADE_METRICS + DAILY_METRICS}
+    for k, size in enumerate(chunk_sizes(n_draws, max(len(entry), len(daily_index)), max_cells)):
+        rng = np.random.default_rng([seed, k])
+        for m, values in metrics(random_selections(rng, len(entry), n_selected, size)).items():
+            null[m].append(values)
+
+    rows = []
+    for m in TRADE_METRICS + DAILY_METRICS:
+        values = np.concatenate(null[m])
+        ok = ~np.isnan(values)
+        obs = float(observed[m][0])
+        rows.append({
+            "metric": m,
+            "observed": obs,
+            "null_mean": float(values[ok].mean()) if ok.any() else np.nan,
+            "null_lo": float(np.percentile(values[ok], 2.5)) if ok.any() else np.nan,
+            "null_hi": float(np.percentile(values[ok], 97.5)) if ok.any() else np.nan,
+            "p_value": (int((values[ok] >= obs).sum()) + 1) / (int(ok.sum()) + 1) if ok.any() and not np.isnan(obs) else np.nan
+        })
+    return pd.DataFrame(rows).set_index("metric")
@@ -0,0 +1,27 @@
+# named ticker universes
+# a universe is a csv file in the universes directory with a ticker column, or a path to such a file
+import os
+import pandas as pd
+
+UNIVERSE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "universes")
+
+def list_universes(universe_dir=UNIVERSE_DIR):
+    if not os.path.isdir(universe_dir):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(universe_dir) if f.endswith(".csv"))
+
+def universe_path(name, universe_dir=UNIVERSE_DIR):
+    if name.endswith(".csv") or os.sep in name:
+        return name
+    return os.path.join(universe_dir, f"{name}.csv")
+
+def load_universe(name, universe_dir=UNIVERSE_DIR):
+    # tickers in file order, upper case and without repeats, the ticker or symbol column or else the first one
+    path = universe_path(name, universe_dir)
+    if not os.path.exists(path):
+        raise ValueError(f"unknown universe {name}, expected {path}")
+    df = pd.read_csv(path, dtype=str)
+    lower = {c.lower(): c for c in df.columns}
+    col = lower.get("ticker", lower.get("symbol", df.columns[0]))
+    tickers = df[col].dropna().str.strip().str.upper()
+    return list(dict.fromkeys(t for t in tickers if t))
@@ -0,0 +1,110 @@
+# walk forward evaluation of the signal threshold
+# the threshold is chosen on a trailing training window and traded on the next test window, rolling through the history
+# data and events are built once, every window only slices them, windows run on a process pool sharing the prices
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import backtest
+import grid
+
+_worker = {}
+
+def walk_windows(start, end, train_months=36, test_months=12, step_months=None):
+    # (train_start, train_end, test_start, test_end) with every end excluded, test windows stop at the day after end
+    start = pd.Timestamp(start)
+    stop = pd.Timestamp(end) + pd.Timedelta(days=1)
+    step = pd.DateOffset(months=step_months or test_months)
+    windows = []
+    train_start = start
+    while True:
+        test_start = train_start + pd.DateOffset(months=train_months)
+        if test_start >= stop:
+            break
+        test_end = min(test_start + pd.DateOffset(months=test_months), stop)
+        windows.append((train_start, test_start, test_start, test_end))
+        train_start = train_start + step
+    return windows
+
+def window_data(data, start, end):
+    # same prices and calendar, equity and benchmark measured over [start, end)
+    return dict(data, start_date=start, end_date=end - pd.Timedelta(days=1))
+
+def event_dates(events):
+    return pd.to_datetime(events["entry_date"]).values, pd.to_datetime(events["exit_date"]).values
+
+def window_events(entry, exit_, window):
+    # training only sees events that were closed by its end, testing trades every event entered inside it
+    train_start, train_end, test_start, test_end = (np.datetime64(t, "ns") for t in window)
+    train = np.flatnonzero((entry >= train_start) & (exit_ < train_end))
+    test = np.flatnonzero((entry >= test_start) & (entry < test_end))
+    return train, test
+
+def choose_threshold(stats, objective, fallback):
+    scores = stats[objective].astype(float)
+    if scores.notna().any():
+        best = scores.idxmax()
+        return float(best), float(scores[best])
+    return float(fallback), np.nan
+
+def evaluate_window(cfg, data, events, thresholds, objective, window, train, test):
+    train_start, train_end, test_start, test_end = window
+    stats, _, _, _ = backtest.sweep_thresholds(cfg, thresholds, window_data(data, train_start, train_end),
+                                               events.iloc[train].reset_index(drop=True))
+    threshold, score = choose_threshold(stats, objective, cfg["three_month_signal_threshold"])
+    trades = backtest.signal_trades(events.iloc[test].reset_index(drop=True), dict(cfg, three_month_signal_threshold=threshold))
+    test_stats, _, _ = backtest.evaluate(trades, window_data(data, test_start, test_end))
+    row = {"train_start": train_start, "train_end": train_end, "test_start": test_start, "test_end": test_end,
+           "threshold": threshold, f"train_{objective}": score, "train_events": len(train)}
+    row.update({f"test_{k}": v for k, v in test_stats.items()})
+    return row, threshold
+
+def init_worker(handles, meta, cfg, events, thresholds, objective):
+    # the blocks are kept referenced so the mapping lives as long as the worker
+    _worker["blocks"], _worker["data"] = grid.attach_data(handles, meta)
+    _worker["args"] = (cfg, events, thresholds, objective)
+
+def run_window(task):
+    cfg, events, thresholds, objective = _worker["args"]
+    return evaluate_window(cfg, _worker["data"], events, thresholds, objective, *task)
+
+def walk_forward(cfg, thresholds, train_months=36, test_months=12, step_months=None, objective="sharpe",
+                 data=None, events=None, max_workers=None):
+    # returns one row per window, the stats of the stitched out of sample run, its trades and its equity curves
+    # out of sample trades of all windows are traded as one book, a position stays open past its window until its exit
+    data = data if data is not None else backtest.load_market_data(cfg)
+    events = events if events is not None else backtest.build_events(data, cfg)
+    if data.get("returns") is None:
+        data = dict(data, returns=backtest.price_returns(data["panel"].values))
+    thresholds = np.unique(np.asarray(thresholds, dtype=float))
+    windows = walk_windows(data["start_date"], data["end_date"], train_months, test_months, step_months)
+    if not windows:
+        raise ValueError("the backtest span is shorter than one training window")
+    entry, exit_ = event_dates(events)
+    tasks = [(window,) + window_events(entry, exit_, window) for window in windows]
+
+    if max_workers == 1:
+        results = [evaluate_window(cfg, data, events, thresholds, objective, *task) for task in tasks]
+    else:
+        blocks, handles, meta = grid.share_data(data)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                     initargs=(handles, meta, cfg, events, thresholds, objective)) as pool:
+                results = list(pool.map(run_window, tasks))
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    # with steps shorter than the test window an event belongs to the first window that tested it
+    # and only that window's threshold decides whether it is traded
+    r_3m = events["r_3m"].to_numpy()
+    claimed = np.zeros(len(events), dtype=bool)
+    picked = []
+    for (_, _, test), (_, threshold) in zip(tasks, results):
+        own = test[~claimed[test]]
+        claimed[own] = True
+        picked.append(own[r_3m[own] >= threshold])
+    trades = events.iloc[np.concatenate(picked)].sort_values(["entry_date", "ticker"], kind="stable").reset_index(drop=True)
+    oos = window_data(data, windows[0][2], windows[-1][3])
+    stats, equity, bench_equity = backtest.evaluate(trades, oos)
+    return pd.DataFrame([row for row, _ in results]), stats, trades, equity, bench_equity